@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# --- Audio cache ---
+# Content-addressed on-disk cache for transcription. Re-running a recording (to switch
+# between rag and sft, or to try another title or instruction) should not decode and
+# transcribe it again. Entries are keyed by the SHA-256 of the audio file's bytes, so a
+# renamed or copied file still hits:
+#   transcripts/<hash>-<backend>-<size>.json   Whisper segments with timestamps
+#   audio/<hash>.npy                           decoded 16 kHz float32 samples (optional),
+#                                              read back as a memory-mapped array
+# The directory is kept under MEMORY_FORGE_AUDIO_CACHE_MB by evicting the least recently
+# used entries; a hit refreshes the entry's modification time.
+
+CACHE_DIR = Path(os.getenv("MEMORY_FORGE_AUDIO_CACHE") or Path(__file__).with_name("audio_cache"))
+MAX_BYTES = int(float(os.getenv("MEMORY_FORGE_AUDIO_CACHE_MB", "2048")) * 1024 * 1024)
+# Decoded audio is large (about 230 MB per hour), so it is only kept when asked for
+KEEP_AUDIO = os.getenv("MEMORY_FORGE_CACHE_DECODED_AUDIO", "0") == "1"
+
+# Bump when the entry layout changes; older entries are ignored and evicted over time
+CACHE_FORMAT = 1
+
+
+class AudioCache:
+    # Input: directory (Path), max_bytes (int) size cap, keep_audio (bool) cache decoded samples
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, keep_audio=KEEP_AUDIO):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.keep_audio = keep_audio
+        self.hits = 0
+        self.misses = 0
+        # (path, size, mtime) -> hash, so a file is only read once per process
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    # Output: hex SHA-256 of the file's contents
+    def audio_hash(self, path):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(block)
+            digest = self._hashes[memo_key] = sha.hexdigest()
+        return digest
+
+    # Input: audio_hash (string), backend (string), size (string)
+    # Output: list of segment dicts, or None on a miss
+    def transcript(self, audio_hash, backend, size):
+        path = self._transcript_path(audio_hash, backend, size)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            entry = None
+        if entry is None or entry.get("format") != CACHE_FORMAT:
+            self.misses += 1
+            return None
+        self.hits += 1
+        _touch(path)
+        return entry["segments"]
+
+    # Stores a complete transcript; a cache that cannot be written is not an error
+    def store_transcript(self, audio_hash, backend, size, segments):
+        entry = {
+            "format": CACHE_FORMAT,
+            "audio": audio_hash,
+            "backend": backend,
+            "size": size,
+            "segments": segments,
+        }
+        self._write(self._transcript_path(audio_hash, backend, size), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+    # Decoded samples for an audio file, from the cache (memory-mapped) or by decoding it
+    # Input: audio_hash (string), path (string) of the audio file, decode (callable path -> samples)
+    # Output: float32 array
+    def decoded_audio(self, audio_hash, path, decode):
+        if not self.keep_audio:
+            return decode(path)
+        cached = self.directory / "audio" / f"{audio_hash}.npy"
+        try:
+            samples = np.load(cached, mmap_mode="r")
+        except (OSError, ValueError):
+            samples = None
+        if samples is not None:
+            _touch(cached)
+            return samples
+
+        samples = np.ascontiguousarray(decode(path), dtype=np.float32)
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cached.with_name(f"{cached.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+            np.save(tmp_path, samples)
+            os.replace(tmp_path, cached)
+            self.evict()
+        except OSError:
+            pass
+        return samples
+
+    # Deletes least recently used entries until the cache fits in max_bytes
+    # Output: number of bytes freed
+    def evict(self):
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*/*"):
+                if ".tmp" in path.name:
+                    # Being written by another job
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _mtime, size, _path in entries)
+            freed = 0
+            for _mtime, size, path in sorted(entries):
+                if total - freed <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    freed += size
+                except OSError:
+                    pass
+            return freed
+
+    # Output: dict with hits, misses, entries and bytes on disk
+    def stats(self):
+        files = [path for path in self.directory.glob("*/*") if path.is_file()]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(files),
+            "bytes": sum(path.stat().st_size for path in files),
+            "max_bytes": self.max_bytes,
+        }
+
+    def _transcript_path(self, audio_hash, backend, size):
+        return self.directory / "transcripts" / f"{audio_hash}-{backend}-{size}.json"
+
+    def _write(self, path, data):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError:
+            pass
+
+
+# Marks an entry as recently used
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Process-wide cache used by transcribe.py
+AUDIO_CACHE = AudioCache()
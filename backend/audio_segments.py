@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import transcription_backends
+from transcription_backends import SAMPLE_RATE, get_backend
+from whisper_models import MODEL_SIZES
+
+# --- Long audio ---
+# A long recording transcribed with one model.transcribe() call runs on a single decode loop.
+# Instead the audio is decoded once, cut at pauses (energy-based voice activity detection)
+# into segments of about SEGMENT_SECONDS, and the segments are transcribed in parallel by a
+# pool of processes, each with its own model. The texts are stitched back together in order
+# and segment timestamps are shifted by the segment's offset in the recording.
+
+# Length the segments aim for; cuts land on the pause closest to each target
+SEGMENT_SECONDS = float(os.getenv("MEMORY_FORGE_SEGMENT_SECONDS", "60"))
+
+# Recordings shorter than this are not worth a process pool
+PARALLEL_MIN_SECONDS = float(os.getenv("MEMORY_FORGE_PARALLEL_MIN_SECONDS", "300"))
+
+# Frame size of the energy analysis and the shortest pause a cut may be placed in
+FRAME_MS = 30
+MIN_SILENCE_MS = 300
+
+# A frame is silent when its level is within this margin of the recording's noise floor
+# (10th percentile of frame levels), and never when it is louder than SPEECH_DB
+SILENCE_MARGIN_DB = 10.0
+SILENCE_FLOOR_DB = -50.0
+SPEECH_DB = -25.0
+
+
+# --- Silence detection ---
+# Input: samples (float32 array, 16 kHz mono), sample_rate (int)
+# Output: list of (start, end) sample ranges of pauses of at least MIN_SILENCE_MS
+def find_silences(samples, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, min_silence_ms=MIN_SILENCE_MS):
+    frame = int(sample_rate * frame_ms / 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return []
+    frames = np.asarray(samples[:count * frame], dtype=np.float32).reshape(count, frame)
+    levels = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    threshold = min(max(np.percentile(levels, 10) + SILENCE_MARGIN_DB, SILENCE_FLOOR_DB), SPEECH_DB)
+    silent = levels < threshold
+
+    # Boundaries of runs of silent frames: +1 where a run starts, -1 where it ends
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = max(1, min_silence_ms // frame_ms)
+    return [
+        (int(start) * frame, int(end) * frame)
+        for start, end in zip(starts, ends)
+        if end - start >= min_frames
+    ]
+
+
+# Cuts a recording into segments of about segment_seconds, at pauses where possible
+# Each cut goes in the middle of the pause closest to the target length, within half to
+# twice the target; with no pause in that range the segment is cut hard at twice the target
+# (or at the end of the recording, if that comes first).
+# Input: samples (float32 array), sample_rate (int), segment_seconds (float)
+# Output: list of (start, end) sample ranges covering the whole recording in order
+def split_on_silence(samples, sample_rate=SAMPLE_RATE, segment_seconds=SEGMENT_SECONDS):
+    total = len(samples)
+    target = int(segment_seconds * sample_rate)
+    if total <= target * 3 // 2:
+        return [(0, total)]
+
+    cuts = [(start + end) // 2 for start, end in find_silences(samples, sample_rate)]
+    segments = []
+    position = 0
+    while total - position > target * 3 // 2:
+        # Never past the end: a hard cut there would leave an empty (reversed) last range
+        limit = min(position + target * 2, total)
+        low = bisect_left(cuts, position + target // 2)
+        high = bisect_right(cuts, limit)
+        if low < high:
+            cut = min(cuts[low:high], key=lambda candidate: abs(candidate - position - target))
+        else:
+            cut = limit
+        segments.append((position, cut))
+        position = cut
+    segments.append((position, total))
+    # Empty ranges would still cost a Whisper call each
+    return [(start, end) for start, end in segments if end > start]
+
+
+# --- Parallel transcription ---
+# Model of one pool process, loaded once by _init_worker
+_MODEL = None
+_BACKEND = None
+
+
+def _init_worker(backend, size, threads):
+    global _MODEL, _BACKEND
+    # Split the cores between the pool processes instead of every process using all of them
+    transcription_backends.INTRA_OP_THREADS = threads
+    _BACKEND = get_backend(backend)
+    _MODEL = _BACKEND.load(size)
+
+
+def _transcribe_segment(job):
+    offset, samples = job
+    result = _BACKEND.transcribe(_MODEL, samples)
+    for segment in result["segments"]:
+        segment["start"] += offset
+        segment["end"] += offset
+    return result
+
+
+# Transcribes a long recording segment by segment on a process pool
+# Input: audio (float32 samples, 16 kHz mono), size (string) model size,
+#        backend (string or None) transcription backend, workers (int) pool processes
+# Output: result dict shaped like TranscriptionBackend.transcribe, with timestamps relative
+#         to the start of the recording
+def transcribe_parallel(audio, size, backend=None, workers=None):
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unknown Whisper model {size!r}, expected one of {', '.join(MODEL_SIZES)}")
+    workers = workers or os.cpu_count() or 1
+    segments = split_on_silence(audio)
+    workers = min(workers, len(segments))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Transcribing {len(segments)} segment(s) on {workers} process(es)...")
+
+    jobs = [(start / SAMPLE_RATE, audio[start:end]) for start, end in segments]
+    # spawn: forking a process that already runs threads (the worker) or torch is unsafe
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(get_backend(backend).name, size, threads),
+    ) as pool:
+        results = list(pool.map(_transcribe_segment, jobs))
+
+    languages = Counter(result["language"] for result in results if result.get("language"))
+    return {
+        "text": " ".join(result["text"].strip() for result in results if result["text"].strip()),
+        "segments": [segment for result in results for segment in result["segments"]],
+        "language": languages.most_common(1)[0][0] if languages else None,
+    }
@@ -0,0 +1,382 @@
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from audio_cache import AUDIO_CACHE
+from output_sinks import open_sink, pop_format_flag
+from output_writer import DURABILITY
+from pipeline import Failed, Stage, run_pipeline
+from process import clean_transcript, iter_records, punctuate_parts, stream_parts
+from transcribe import transcribe_segments
+
+# --- Batch processing ---
+# Processes every transcript (.txt) and recording (.mp3, .wav, .m4a) of a directory or glob
+# into one output file, each file titled with its name. Files go through a pipeline
+# (pipeline.py) whose stages run on executors suited to their work, so different files are
+# in different stages at the same time:
+#   load        transcribe recordings (process pool, one Whisper model per process) or
+#               read and clean transcripts
+#   punctuate   OpenAI requests on the shared asyncio client (openai_client.py), several
+#               files in flight on threads that wait for the answers
+#   tag         chunk and tag the formatted text (process pool)
+# and the main thread writes each finished file's records to the output. While one file
+# waits on the API the next is transcribing, so a run takes about as long as its slowest
+# stage rather than the sum of all of them.
+#
+# The run is resumable. Once a file's records are written, the file is recorded in a
+# manifest (<output>.manifest.jsonl) by a key made of the SHA-256 of its content and what
+# else its records depend on (the mode, and the title for RAG or the instruction for SFT).
+# A new run with the same output skips every file whose key is in the manifest (a copy
+# under another name too, unless the name goes into its records). The output may
+# already hold other records (the app appends to the same files), so a run only ever
+# touches what it can prove it wrote: records are appended in blocks, and just before a
+# block goes out a "pending" line is added to the manifest with the files in it and where
+# the block lands (byte offsets and SHA-256 for JSONL, the part file for Parquet/Arrow),
+# written while the output is locked so nobody else can append in between. On resume, a
+# pending block that is complete and matches is kept and its files count as done; one cut
+# short by a crash (its first bytes match) is moved out to <output>.unfinished; anything that
+# does not match is left alone and its files processed again. Files processed again are
+# punctuated from the punctuation cache rather than by OpenAI.
+
+TEXT_SUFFIXES = {".txt"}
+AUDIO_SUFFIXES = {".mp3", ".wav", ".m4a"}
+
+# Processes transcribing recordings
+BATCH_WORKERS = int(os.getenv("MEMORY_FORGE_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+# Files waiting on OpenAI at once (the requests themselves are limited in openai_client.py)
+PUNCTUATE_FILES = int(os.getenv("MEMORY_FORGE_BATCH_PUNCTUATE_FILES", "8"))
+# Processes chunking and tagging
+TAG_WORKERS = int(os.getenv("MEMORY_FORGE_BATCH_TAG_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+
+
+# Input: source (string) a directory (searched recursively) or a glob pattern
+# Output: sorted list of Paths of supported files
+def find_inputs(source):
+    if os.path.isdir(source):
+        paths = Path(source).rglob("*")
+    else:
+        paths = map(Path, glob.glob(source, recursive=True))
+    suffixes = TEXT_SUFFIXES | AUDIO_SUFFIXES
+    return sorted(path for path in paths if path.is_file() and path.suffix.lower() in suffixes)
+
+
+# Output: Path of the manifest that belongs to an output file
+def manifest_path(output_path):
+    return Path(str(output_path) + ".manifest.jsonl")
+
+
+# Reads the manifest and settles the block an interrupted run was writing, if any
+# Output: dict of key (see job_key) -> manifest entry
+def load_manifest(output_path):
+    done = {}
+    # Entries of the last pending block that no later line accounts for
+    pending = None
+    unsettled = {}
+    path = manifest_path(output_path)
+    if not path.is_file():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Last line of an interrupted write
+                continue
+            if "pending" in entry:
+                pending = entry
+                unsettled = {_entry_key(item): item for item in entry["pending"]}
+                continue
+            unsettled.pop(_entry_key(entry), None)
+            if not entry.get("abandoned"):
+                done[_entry_key(entry)] = entry
+
+    if unsettled:
+        kept = _settle_block(Path(output_path), pending)
+        with open(path, "a", encoding="utf-8") as manifest:
+            entries = [{**entry, "output_bytes": pending.get("output_end")} for entry in unsettled.values()]
+            if kept:
+                done.update((_entry_key(entry), entry) for entry in entries)
+            else:
+                entries = [{"key": _entry_key(entry), "hash": entry["hash"], "path": entry["path"], "abandoned": True} for entry in entries]
+            _write_manifest(manifest, entries)
+    return done
+
+
+# Output: manifest key of a file's records: the same content gives the same records only in
+#         the same mode, with the same title (RAG) or instruction (SFT)
+def job_key(content_hash, mode, title, instruction):
+    detail = instruction if mode == "sft" else title
+    return hashlib.sha256(json.dumps([content_hash, mode, detail]).encode("utf-8")).hexdigest()
+
+
+def _entry_key(entry):
+    # Entries written before keys existed do not say what mode they were for; their hash
+    # matches no key, so those files are processed again
+    return entry.get("key", entry["hash"])
+
+
+# Works out what became of a block whose files an interrupted run never recorded as done
+# Output: True if the whole block is in the output (its files are done), False if not
+def _settle_block(output, pending):
+    if "part" in pending:
+        part = output / pending["part"]
+        if part.is_file():
+            return True
+        tmp_path = part.with_name(part.name + ".tmp")
+        if tmp_path.is_file():
+            tmp_path.unlink()
+        return False
+
+    start, end = pending["output_start"], pending["output_end"]
+    size = output.stat().st_size if output.is_file() else 0
+    if size <= start:
+        # The block never got out, or the output was cut back or replaced since
+        return False
+    with open(output, "r+b") as f:
+        if size >= end:
+            f.seek(start)
+            if hashlib.sha256(f.read(end - start)).hexdigest() == pending["sha256"]:
+                return True
+            print(f"Output at {start}-{end} is not the block this run wrote; leaving it as it is", file=sys.stderr)
+            return False
+        # Cut short by a crash, or never written and someone else appended since: only bytes
+        # that start like the block are this run's. Whatever follows them was appended after
+        # it and cannot be told apart from it, so they are kept aside rather than thrown away.
+        head_bytes = pending.get("head_bytes")
+        f.seek(start)
+        if head_bytes is None or size - start < head_bytes or hashlib.sha256(f.read(head_bytes)).hexdigest() != pending["head_sha256"]:
+            print(f"Output from {start} is not the start of the block this run wrote; leaving it as it is", file=sys.stderr)
+            return False
+        f.seek(start)
+        tail = f.read()
+        unfinished = Path(str(output) + ".unfinished")
+        with open(unfinished, "ab") as target:
+            target.write(tail)
+            target.flush()
+            os.fsync(target.fileno())
+        f.truncate(start)
+    print(f"Moved {len(tail)} byte(s) of unfinished output to {unfinished}", file=sys.stderr)
+    return False
+
+
+# Processes every supported file under source into output_path, skipping finished ones
+# Input: source (string) directory or glob, mode ("rag" or "sft"), output_path (string),
+#        instruction (string) for SFT examples, workers (int or None) transcription
+#        processes, model and backend (string or None) for recordings, output_format
+#        (string or None) as in process()
+# Output: dict with the number of files processed, skipped and failed, records, seconds
+#         and the busy seconds of every stage
+def run_batch(source, mode, output_path, instruction="", workers=None, model=None, backend=None, output_format=None):
+    started = time.monotonic()
+    paths = find_inputs(source)
+    done = load_manifest(output_path)
+
+    jobs = {}
+    skipped = 0
+    hashes = {}
+    for path in paths:
+        content_hash = AUDIO_CACHE.audio_hash(path)
+        key = job_key(content_hash, mode, path.stem, instruction)
+        if key in done or key in jobs:
+            skipped += 1
+        else:
+            jobs[key] = path
+            hashes[key] = content_hash
+    print(f"{len(paths)} file(s) found, {skipped} already done, {len(jobs)} to process")
+
+    stats = {"processed": 0, "skipped": skipped, "failed": 0, "records": 0, "seconds": 0.0, "stages": {}}
+    if not jobs:
+        return stats
+
+    # A file's records have to be on disk before the manifest says they are, and they are
+    # only written by _commit(), one block at a time
+    writer = open_sink(output_path, output_format, "record" if DURABILITY == "record" else "batch", hold=True)
+    workers = max(1, min(workers or BATCH_WORKERS, len(jobs)))
+    tag_workers = max(1, min(TAG_WORKERS, len(jobs)))
+    # spawn: the jobs load torch and start threads of their own
+    spawn = multiprocessing.get_context("spawn")
+    if any(path.suffix.lower() in AUDIO_SUFFIXES for path in jobs.values()):
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        loader = ProcessPoolExecutor(workers, mp_context=spawn, initializer=_init_worker, initargs=(threads,))
+    else:
+        # Reading transcripts is not worth a process each
+        loader = ThreadPoolExecutor(workers)
+    tagger = ProcessPoolExecutor(
+        tag_workers, mp_context=spawn, initializer=_init_tag_worker, initargs=(max(1, (os.cpu_count() or 1) // tag_workers),)
+    )
+    executors = [loader, ThreadPoolExecutor(PUNCTUATE_FILES), tagger]
+    stages = [
+        Stage("load", _load_job, executors[0], workers + 1),
+        Stage("punctuate", _punctuate_job, executors[1], PUNCTUATE_FILES),
+        Stage("tag", _tag_job, executors[2], tag_workers + 1),
+    ]
+
+    def job_values():
+        for key, path in jobs.items():
+            job = {"path": str(path), "mode": mode, "instruction": instruction, "model": model, "backend": backend}
+            yield key, (time.monotonic(), job)
+
+    audio_seconds = 0.0
+    busy = stats["stages"]
+    # Manifest entries of files whose records are written but not flushed yet
+    uncommitted = []
+    try:
+        with open(manifest_path(output_path), "a", encoding="utf-8") as manifest:
+            try:
+                for key, result in run_pipeline(job_values(), _timed_stages(stages), busy=busy):
+                    path = jobs[key]
+                    if isinstance(result, Failed):
+                        stats["failed"] += 1
+                        print(f"Failed {path} ({result.stage}): {type(result.error).__name__}: {result.error}", file=sys.stderr)
+                        continue
+                    job_started, job = result
+
+                    writer.write_many(job["records"])
+                    entry = {
+                        "key": key,
+                        "hash": hashes[key],
+                        "path": str(path),
+                        "records": len(job["records"]),
+                        "seconds": round(time.monotonic() - job_started, 2),
+                        "audio_seconds": job["audio_seconds"],
+                    }
+                    uncommitted.append(entry)
+                    # Columnar parts hold many files' records; JSONL commits every file
+                    if sum(item["records"] for item in uncommitted) >= writer.commit_records:
+                        _commit(writer, manifest, uncommitted)
+
+                    stats["processed"] += 1
+                    stats["records"] += entry["records"]
+                    audio_seconds += entry["audio_seconds"]
+                    _report_progress(stats, len(jobs), path, entry, audio_seconds, time.monotonic() - started)
+            finally:
+                # Files that finished before an error or interrupt still count as done
+                _commit(writer, manifest, uncommitted)
+    except KeyboardInterrupt:
+        print("Interrupted; run again with the same output to resume", file=sys.stderr)
+        raise
+    finally:
+        writer.close()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    stats["stages"] = {name: round(seconds, 2) for name, seconds in busy.items()}
+    return stats
+
+
+# Flushes the writer, then records the files whose records that made durable
+def _commit(writer, manifest, entries):
+    if not entries:
+        return
+    # Where the block is about to land, so a resume can tell it from anyone else's output
+    output_bytes = writer.flush(lambda block: _write_manifest(manifest, [{"pending": entries, **block}]))
+    # output_bytes: end of the output after the block; None for part directories
+    _write_manifest(manifest, [{**entry, "output_bytes": output_bytes} for entry in entries])
+    entries.clear()
+
+
+def _write_manifest(manifest, entries):
+    for entry in entries:
+        manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    manifest.flush()
+    os.fsync(manifest.fileno())
+
+
+def _report_progress(stats, total, path, entry, audio_seconds, elapsed):
+    finished = stats["processed"] + stats["failed"]
+    rate = stats["processed"] / elapsed if elapsed else 0.0
+    remaining = (total - finished) / rate if rate else 0.0
+    line = (
+        f"[{finished}/{total}] {path.name}: {entry['records']} record(s) in {entry['seconds']:.1f}s"
+        f" | {rate * 60:.1f} file(s)/min, {stats['records'] / elapsed:.2f} record(s)/s"
+    )
+    if audio_seconds:
+        line += f", {audio_seconds / elapsed:.1f}x real time"
+    left = f"{remaining:.0f}s" if remaining < 120 else f"{remaining / 60:.0f} min"
+    print(f"{line} | about {left} left")
+
+
+# --- Stages ---
+# Every stage takes and returns (time the job started, job dict); the job dict gains the
+# stage's results as it moves along
+
+# Wraps the stage functions so they pass the job's start time through
+def _timed_stages(stages):
+    return [stage._replace(function=_StageFunction(stage.function)) for stage in stages]
+
+
+class _StageFunction:
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, value):
+        job_started, job = value
+        return job_started, self.function(job)
+
+
+def _init_worker(threads):
+    # Split the cores between the pool processes instead of every process using all of them
+    import transcription_backends
+    transcription_backends.INTRA_OP_THREADS = threads
+
+
+def _init_tag_worker(threads):
+    # Same for the threads a long text is tagged with (see tagging.TAG_THREADS)
+    import tagging
+    tagging.TAG_THREADS = threads
+
+
+# Transcribes a recording (or reads a transcript) into raw parts
+def _load_job(job):
+    path = job["path"]
+    if Path(path).suffix.lower() in AUDIO_SUFFIXES:
+        # One process per file already; a pool inside the pool would oversubscribe the cores
+        segments = transcribe_segments(path, job["model"], job["backend"], workers=1)
+        parts = list(stream_parts(segments))
+        audio_seconds = parts[-1][2] if parts else 0.0
+    else:
+        parts = [(clean_transcript(path), None, None)]
+        audio_seconds = 0.0
+    return {**job, "parts": parts, "audio_seconds": audio_seconds}
+
+
+def _punctuate_job(job):
+    return {**job, "parts": punctuate_parts(job["parts"])}
+
+
+def _tag_job(job):
+    title = Path(job["path"]).stem
+    records = list(iter_records(job["parts"], title, job["instruction"], job["mode"]))
+    return {**job, "parts": None, "records": records}
+
+
+# --- CLI usage ---
+if __name__ == "__main__":
+    # --format <name> picks the output format (see output_sinks.py)
+    argv, output_format = pop_format_flag(sys.argv)
+    if len(argv) < 4:
+        print("Usage: python batch.py <directory|glob> <mode> <output_path> [instruction] [workers] [model] [backend] [--format name]")
+        print("Run again with the same output_path to resume an interrupted batch.")
+        sys.exit(1)
+
+    source, mode, output_path = argv[1:4]
+    instruction = argv[4] if len(argv) > 4 else ""
+    workers = int(argv[5]) if len(argv) > 5 else None
+    model = argv[6] if len(argv) > 6 else None
+    backend = argv[7] if len(argv) > 7 else None
+
+    stats = run_batch(source, mode, output_path, instruction, workers, model, backend, output_format)
+    print(
+        f"Processed {stats['processed']} file(s) into {stats['records']} record(s) in {stats['seconds']:.0f}s; "
+        f"{stats['skipped']} skipped, {stats['failed']} failed"
+    )
+    if stats["stages"]:
+        print("Busy time by stage: " + ", ".join(f"{name} {seconds:.0f}s" for name, seconds in stats["stages"].items()))
+    sys.exit(1 if stats["failed"] else 0)
@@ -0,0 +1,154 @@
+import os
+from typing import NamedTuple
+
+import regex as re
+
+# --- RAG chunking ---
+# A long transcript written as one record makes one huge "content" field, and five tags
+# cannot describe all of it. Formatted text is instead cut into chunks of whole sentences,
+# at most CHUNK_SIZE tokens (or characters, with MEMORY_FORGE_CHUNK_UNIT=characters) each,
+# and each chunk starts with up to CHUNK_OVERLAP of the sentences that ended the chunk before
+# it, so a thought cut at a boundary is still retrievable in one piece. A single sentence
+# longer than CHUNK_SIZE is cut between words.
+# The chunker reads its input piece by piece and only holds the sentences of the chunk being
+# built, so it runs in bounded memory however long the text is. CHUNK_SIZE=0 turns it off
+# (one chunk per text).
+
+CHUNK_SIZE = int(os.getenv("MEMORY_FORGE_CHUNK_SIZE", "400"))
+CHUNK_OVERLAP = int(os.getenv("MEMORY_FORGE_CHUNK_OVERLAP", "50"))
+CHUNK_UNIT = os.getenv("MEMORY_FORGE_CHUNK_UNIT", "tokens")
+
+# End of a sentence: terminal punctuation, closing quotes or brackets, then whitespace.
+# The whitespace after a sentence belongs to it, so sentences tile the text exactly.
+_SENTENCE_END = re.compile(r"""[.!?…]+["'”’)\]]*\s+""")
+# A period after one of these does not end a sentence
+# (single letters are initials, except "I" and "a", which end sentences often enough)
+_ABBREVIATION = re.compile(r"\b(?:mr|mrs|ms|dr|prof|st|vs|etc|e\.g|i\.e|jr|sr|approx|(?![ia]\b)\p{L})\.$", re.IGNORECASE)
+# Characters before a sentence end the abbreviation check looks at (the longest
+# abbreviation, "approx.", and then some); \b still sees the character before the window
+_ABBREVIATION_CHARS = 8
+_WORD_END = re.compile(r"\S+\s*")
+# Text without sentence ends (unpunctuated input) is passed on in pieces of about this many
+# characters, cut between words, instead of piling up in memory
+_MAX_PENDING = 1 << 16
+
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    # Character offsets of text in the whole input: text == whole[start:end]
+    start: int
+    end: int
+
+
+class _Sentence(NamedTuple):
+    text: str
+    start: int
+    size: int
+
+
+# Splits text arriving in pieces into sentences
+# Input: pieces (iterable of strings) consecutive parts of one text
+# Output: iterator of (sentence, start offset) covering the text exactly, whitespace included
+def iter_sentences(pieces):
+    buffer = ""
+    # Offset of buffer[0] in the whole text
+    offset = 0
+    for piece in pieces:
+        buffer += piece
+        cut = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            if match.end() == len(buffer):
+                # The next piece may continue the whitespace (or the punctuation)
+                break
+            if _ABBREVIATION.search(buffer, max(cut, match.start() - _ABBREVIATION_CHARS), match.start() + 1):
+                continue
+            yield buffer[cut:match.end()], offset + cut
+            cut = match.end()
+        if len(buffer) - cut > _MAX_PENDING:
+            space = buffer.rfind(" ", cut, len(buffer) - 1)
+            if space > cut:
+                yield buffer[cut:space + 1], offset + cut
+                cut = space + 1
+        buffer = buffer[cut:]
+        offset += cut
+    if buffer:
+        yield buffer, offset
+
+
+# Output: callable text -> size in CHUNK_UNIT (tokens via count_tokens, or characters)
+def chunk_measure(count_tokens, unit=CHUNK_UNIT):
+    if unit == "characters":
+        return len
+    if unit != "tokens":
+        raise ValueError(f"Unknown chunk unit {unit!r}, expected tokens or characters")
+    return count_tokens
+
+
+# Cuts text into overlapping chunks of whole sentences
+# Input: pieces (iterable of strings) consecutive parts of one text, measure (callable text -> int),
+#        size (int) largest chunk, 0 for no limit, overlap (int) size of the sentences repeated
+#        from the previous chunk
+# Output: iterator of Chunk, in order, with whitespace trimmed from both ends
+def chunk_text(pieces, measure, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    window = []
+    total = 0
+    # Sentences in the window that no chunk has carried yet
+    fresh = 0
+    index = 0
+    for text, start in iter_sentences(pieces):
+        if text.isspace():
+            continue
+        for sentence in _fit(text, start, measure, size):
+            if size and fresh and total + sentence.size > size:
+                yield _make_chunk(index, window)
+                index += 1
+                window, total = _overlap(window, overlap)
+                fresh = 0
+            # Drop overlap that would leave no room for the new sentence
+            while size and window and total + sentence.size > size:
+                total -= window.pop(0).size
+            window.append(sentence)
+            total += sentence.size
+            fresh += 1
+    if fresh:
+        yield _make_chunk(index, window)
+
+
+# Output: the sentence as one _Sentence, or cut between words into pieces of at most size
+def _fit(text, start, measure, size):
+    cost = measure(text)
+    if not size or cost <= size:
+        return [_Sentence(text, start, cost)]
+    pieces = []
+    piece_start = 0
+    piece_cost = 0
+    for word in _WORD_END.finditer(text):
+        word_cost = measure(word.group())
+        if piece_cost and piece_cost + word_cost > size:
+            pieces.append(_Sentence(text[piece_start:word.start()], start + piece_start, piece_cost))
+            piece_start = word.start()
+            piece_cost = 0
+        piece_cost += word_cost
+    pieces.append(_Sentence(text[piece_start:], start + piece_start, piece_cost))
+    return pieces
+
+
+# Output: (sentences, size) ending the window that fit in overlap, never the whole window
+def _overlap(window, overlap):
+    kept = []
+    total = 0
+    for sentence in reversed(window[1:]):
+        if total + sentence.size > overlap:
+            break
+        kept.append(sentence)
+        total += sentence.size
+    kept.reverse()
+    return kept, total
+
+
+def _make_chunk(index, window):
+    text = "".join(sentence.text for sentence in window)
+    stripped = text.strip()
+    start = window[0].start + len(text) - len(text.lstrip())
+    return Chunk(index, stripped, start, start + len(stripped))
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+import openai
+
+# --- Shared OpenAI client ---
+# One pooled AsyncOpenAI client per process, so every request reuses the same HTTP
+# connections instead of opening (and TLS-handshaking) a new pool per transcript. The client
+# lives on a private event loop thread; synchronous code (the worker's job threads, the
+# punctuation window pool) hands it requests with chat_completion() and waits for the answer.
+#
+# Requests are scheduled to stay inside the account's quota:
+#   - at most MAX_IN_FLIGHT requests are open at once
+#   - token buckets hold requests to RPM requests and TPM tokens per minute; a request is
+#     charged its prompt plus max_tokens, which is how the API counts it
+#   - 429 and 5xx answers and dropped connections are retried up to MAX_RETRIES times with
+#     exponential backoff and jitter, honouring the server's Retry-After
+# With the limits set to the account's, a batch keeps the quota busy without tripping it.
+
+RPM = float(os.getenv("MEMORY_FORGE_OPENAI_RPM", "3500"))
+TPM = float(os.getenv("MEMORY_FORGE_OPENAI_TPM", "90000"))
+MAX_IN_FLIGHT = int(os.getenv("MEMORY_FORGE_OPENAI_MAX_IN_FLIGHT", "8"))
+MAX_RETRIES = int(os.getenv("MEMORY_FORGE_OPENAI_MAX_RETRIES", "6"))
+REQUEST_TIMEOUT = float(os.getenv("MEMORY_FORGE_OPENAI_TIMEOUT", "120"))
+
+# Backoff before retry n (0-based) is about BACKOFF_SECONDS * 2**n, at most BACKOFF_MAX_SECONDS
+BACKOFF_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+class TokenBucket:
+    # Input: per_minute (float) sustained rate, also the burst size
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        # Waiters are served in arrival order, so one large request is not starved by small ones
+        self._lock = asyncio.Lock()
+
+    # Waits until amount can be taken from the bucket, then takes it
+    # An amount above the capacity waits for a full bucket instead of forever
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class OpenAIScheduler:
+    def __init__(self, rpm=RPM, tpm=TPM, max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.tokens = 0
+        self._loop = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    # Sends a chat completion request through the shared client and waits for the response
+    # Input: tokens (int) prompt tokens plus max_tokens, charged against TPM;
+    #        the remaining keyword arguments go to client.chat.completions.create
+    # Output: the ChatCompletion; raises the last error once the retries are used up
+    def chat_completion(self, tokens, **request):
+        future = asyncio.run_coroutine_threadsafe(self.achat_completion(tokens, **request), self._ensure_loop())
+        return future.result()
+
+    # Same as chat_completion for coroutines already running on the scheduler's loop
+    async def achat_completion(self, tokens, **request):
+        attempt = 0
+        while True:
+            async with self._in_flight:
+                await self._requests.acquire(1)
+                await self._tokens.acquire(tokens)
+                self.requests += 1
+                self.tokens += tokens
+                try:
+                    return await self._client.chat.completions.create(**request)
+                except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                    error = e
+                except openai.APIStatusError as e:
+                    if e.status_code < 500:
+                        raise
+                    error = e
+            if attempt >= self.max_retries:
+                raise error
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limited += 1
+            self.retries += 1
+            delay = _retry_after(error)
+            if delay is None:
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"OpenAI request failed ({type(error).__name__}), retrying in {delay:.1f}s", file=sys.stderr)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    # Output: dict with requests, retries, rate_limited, tokens and the configured limits
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "tokens": self.tokens,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    # Starts the event loop thread and the client on first use (and again in a forked child,
+    # which inherits the objects but not the thread)
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="openai-client", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+                self._pid = os.getpid()
+            return self._loop
+
+    # Objects bound to the loop have to be created on it
+    async def _setup(self):
+        # Retries are handled here, where they also count against the buckets
+        self._client = openai.AsyncOpenAI(max_retries=0, timeout=REQUEST_TIMEOUT)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._requests = TokenBucket(self.rpm)
+        self._tokens = TokenBucket(self.tpm)
+
+
+# Output: seconds the server asked to wait before retrying, or None
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return min(BACKOFF_MAX_SECONDS, float(response.headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+# Process-wide scheduler used by process.py
+OPENAI = OpenAIScheduler()
@@ -0,0 +1,260 @@
+import gzip
+import os
+import threading
+import time
+from pathlib import Path
+
+from output_writer import DURABILITY, FLUSH_SECONDS, JsonlWriter
+
+# --- Output sinks ---
+# Output formats for the records process(), transcribe() and batch.py produce:
+#   jsonl        plain JSON lines (default)
+#   jsonl.gz     gzip-compressed JSON lines
+#   jsonl.zst    zstd-compressed JSON lines (pip install zstandard)
+#   parquet      Apache Parquet (pip install pyarrow)
+#   arrow        Arrow IPC files (pip install pyarrow)
+# The format comes from --format on the command line, the output_format argument or
+# MEMORY_FORGE_OUTPUT_FORMAT, and otherwise from the output path's extension.
+#
+# Compressed JSONL is still appended to: every flush adds one gzip member or zstd frame,
+# and both formats read concatenated members/frames back as one stream (zcat, zstdcat,
+# gzip.open). Parquet and Arrow files cannot be appended to, so for those the output path
+# is a directory of part files, one per flush, readable as one dataset
+# (pyarrow.dataset.dataset(path)). Parts are written under a .tmp name and renamed when
+# complete, so an interrupted run never leaves a half-written part behind. Columns are
+# typed: content is a string column, tags a list of strings, tag_counts a map.
+
+OUTPUT_FORMAT = os.getenv("MEMORY_FORGE_OUTPUT_FORMAT") or None
+
+GZIP_LEVEL = int(os.getenv("MEMORY_FORGE_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("MEMORY_FORGE_ZSTD_LEVEL", "3"))
+# Compression works better on larger blocks
+COMPRESSED_FLUSH_BYTES = int(float(os.getenv("MEMORY_FORGE_COMPRESSED_FLUSH_KB", "1024")) * 1024)
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_RECORDS = int(os.getenv("MEMORY_FORGE_ROW_GROUP_RECORDS", "10000"))
+
+_EXTENSIONS = (
+    (".jsonl.gz", "jsonl.gz"),
+    (".gz", "jsonl.gz"),
+    (".jsonl.zst", "jsonl.zst"),
+    (".zst", "jsonl.zst"),
+    (".parquet", "parquet"),
+    (".arrow", "arrow"),
+    (".feather", "arrow"),
+)
+
+
+class GzipJsonlWriter(JsonlWriter):
+    def __init__(self, path, durability=DURABILITY, flush_bytes=COMPRESSED_FLUSH_BYTES, flush_seconds=FLUSH_SECONDS, hold=False):
+        super().__init__(path, durability, flush_bytes, flush_seconds, hold)
+
+    def _encode(self, data):
+        # mtime=0: the same records always compress to the same bytes
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class ZstdJsonlWriter(JsonlWriter):
+    def __init__(self, path, durability=DURABILITY, flush_bytes=COMPRESSED_FLUSH_BYTES, flush_seconds=FLUSH_SECONDS, hold=False):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("The jsonl.zst format needs the zstandard package (pip install zstandard)") from None
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        super().__init__(path, durability, flush_bytes, flush_seconds, hold)
+
+    def _encode(self, data):
+        return self._compressor.compress(data)
+
+
+# --- Columnar sinks ---
+class ColumnarWriter:
+    format = None
+    extension = None
+
+    # Input: path (string or Path) directory of part files, durability (string) as for
+    #        JsonlWriter ("none" skips the fsync of finished parts), row_group_records (int),
+    #        hold (bool) to keep the rows in memory and write the whole part at flush()
+    def __init__(self, path, durability=DURABILITY, row_group_records=ROW_GROUP_RECORDS, hold=False):
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError(f"The {self.format} format needs the pyarrow package (pip install pyarrow)") from None
+        self.pa = pyarrow
+        self.directory = Path(path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.durability = durability
+        self.row_group_records = row_group_records
+        self.hold = hold
+        # A part is closed at every flush, so flushes should not come more often than needed
+        self.commit_records = row_group_records
+        self.records = 0
+        self._rows = []
+        self._schema = None
+        self._writer = None
+        self._part = None
+        self._parts = 0
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        with self._lock:
+            for record in records:
+                self._rows.append(record)
+                if not self.hold and len(self._rows) >= self.row_group_records:
+                    self._write_rows()
+            self.records += len(records)
+
+    # Completes the current part file
+    # Input: before_write (callable or None) called as before_write({"part": file name}) just
+    #        before the part's .tmp file is started (hold=True) or renamed into place
+    # Output: None (parts are whole files; there is no byte offset to resume from)
+    def flush(self, before_write=None):
+        with self._lock:
+            if self.hold and self._rows and before_write is not None:
+                # Nothing of the part is on disk yet, so whatever a crash leaves is named here
+                before_write({"part": self._next_part().name})
+                before_write = None
+            self._write_rows()
+            if self._writer is not None:
+                self._writer.close()
+                if before_write is not None:
+                    before_write({"part": self._part.name})
+                self._close_part()
+                self._writer = None
+                self._schema = None
+            return None
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_rows(self):
+        if not self._rows:
+            return
+        if self._schema is None:
+            self._schema = record_schema(self.pa, self._rows[0])
+        rows = [_row(record) for record in self._rows]
+        self._rows = []
+        if self._writer is None:
+            if self._part is None:
+                self._next_part()
+            self._writer = self._open_part(self._part.with_name(self._part.name + ".tmp"), self._schema)
+        for start in range(0, len(rows), self.row_group_records):
+            table = self.pa.Table.from_pylist(rows[start:start + self.row_group_records], schema=self._schema)
+            self._writer.write_table(table)
+
+    # Output: Path the next part is renamed to when complete (it is written as <name>.tmp)
+    def _next_part(self):
+        self._parts += 1
+        self._part = self.directory / f"part-{time.time_ns()}-{os.getpid()}-{self._parts}{self.extension}"
+        return self._part
+
+    def _open_part(self, path, schema):
+        raise NotImplementedError
+
+    def _close_part(self):
+        tmp_path = self._part.with_name(self._part.name + ".tmp")
+        if self.durability != "none":
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self._part)
+        self._part = None
+
+
+class ParquetWriter(ColumnarWriter):
+    format = "parquet"
+    extension = ".parquet"
+
+    def _open_part(self, path, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(str(path), schema, compression="zstd")
+
+
+class ArrowWriter(ColumnarWriter):
+    format = "arrow"
+    extension = ".arrow"
+
+    def _open_part(self, path, schema):
+        return self.pa.ipc.new_file(str(path), schema)
+
+
+# Column types of RAG records and SFT examples; keys a record has beyond these are not stored
+def record_schema(pa, record):
+    if "instruction" in record and "response" in record:
+        return pa.schema([("instruction", pa.string()), ("response", pa.string())])
+    return pa.schema([
+        ("title", pa.string()),
+        ("content", pa.string()),
+        ("tags", pa.list_(pa.string())),
+        ("tag_counts", pa.map_(pa.string(), pa.int64())),
+        ("tag_version", pa.string()),
+        ("tags_partial", pa.list_(pa.string())),
+        ("chunk", pa.int64()),
+        ("start_char", pa.int64()),
+        ("end_char", pa.int64()),
+        ("start", pa.float64()),
+        ("end", pa.float64()),
+    ])
+
+
+def _row(record):
+    counts = record.get("tag_counts")
+    if counts is None:
+        return record
+    # Map columns take (key, value) pairs
+    return {**record, "tag_counts": list(counts.items())}
+
+
+SINKS = {
+    "jsonl": JsonlWriter,
+    "jsonl.gz": GzipJsonlWriter,
+    "jsonl.zst": ZstdJsonlWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+# Input: path (string or Path) of the output, name (string or None) format asked for
+# Output: name of the format to write; raises ValueError for an unknown one
+def resolve_format(path, name=None):
+    name = name or OUTPUT_FORMAT
+    if name:
+        if name not in SINKS:
+            raise ValueError(f"Unknown output format {name!r}, expected one of {', '.join(SINKS)}")
+        return name
+    lower = str(path).lower()
+    for extension, name in _EXTENSIONS:
+        if lower.endswith(extension):
+            return name
+    return "jsonl"
+
+
+# Opens the writer for an output
+# Input: path (string or Path), output_format (string or None, see resolve_format()),
+#        durability (string) as for JsonlWriter, hold (bool) to write only at flush()
+# Output: a writer with write, write_many, flush, close and commit_records
+def open_sink(path, output_format=None, durability=DURABILITY, hold=False):
+    return SINKS[resolve_format(path, output_format)](path, durability, hold=hold)
+
+
+# Removes "--format <name>" / "--format=<name>" from command-line arguments
+# Output: (remaining arguments, format name or None)
+def pop_format_flag(argv):
+    remaining = []
+    name = None
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--format":
+            name = next(arguments, None)
+        elif argument.startswith("--format="):
+            name = argument.split("=", 1)[1]
+        else:
+            remaining.append(argument)
+    return remaining, name
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory locks; every flush is still a single append of whole lines
+    fcntl = None
+
+# --- Output writer ---
+# Appends records to a JSONL output through one open handle per job. Records are buffered
+# and written when FLUSH_BYTES have piled up, FLUSH_SECONDS after the oldest unwritten one,
+# or when the writer is flushed or closed. Every write appends whole lines under an
+# exclusive advisory lock (fcntl.flock), so jobs in other processes appending to the same
+# file (two app windows, a batch run) never interleave inside a line.
+#
+# A writer opened with hold=True keeps everything buffered until flush() is called, so
+# its caller decides exactly which records make up each appended block (see batch.py).
+#
+# DURABILITY decides when written data is forced to disk:
+#   none     never fsync; the OS writes it back when it likes (fastest)
+#   batch    fsync after every flush (default)
+#   record   write and fsync every record as it comes (slowest, nothing written is lost)
+
+DURABILITY = os.getenv("MEMORY_FORGE_OUTPUT_DURABILITY", "batch")
+FLUSH_BYTES = int(float(os.getenv("MEMORY_FORGE_OUTPUT_FLUSH_KB", "64")) * 1024)
+FLUSH_SECONDS = float(os.getenv("MEMORY_FORGE_OUTPUT_FLUSH_SECONDS", "1"))
+
+DURABILITY_POLICIES = ("none", "batch", "record")
+# Bytes at the start of a block hashed on their own, so a block cut short by a crash can be
+# told from someone else's output (see batch.py)
+HEAD_BYTES = 256
+
+
+class JsonlWriter:
+    # Records a caller should gather before flushing them to commit (see batch.py); a flush
+    # is a cheap append, so 0: commit whenever
+    commit_records = 0
+
+    # Input: path (string or Path) appended to, durability (string) one of DURABILITY_POLICIES,
+    #        flush_bytes (int) and flush_seconds (float) buffering thresholds, hold (bool)
+    #        to buffer until flush() regardless of durability and the thresholds
+    def __init__(self, path, durability=DURABILITY, flush_bytes=FLUSH_BYTES, flush_seconds=FLUSH_SECONDS, hold=False):
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability {durability!r}, expected one of {', '.join(DURABILITY_POLICIES)}")
+        self.path = path
+        self.durability = durability
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.hold = hold
+        self.records = 0
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._buffer = []
+        self._buffered = 0
+        self._timer = None
+        # Records come from several threads (e.g. the worker's jobs); writes are serialised
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        self.write_many([record])
+
+    def write_many(self, records):
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records]
+        if not lines:
+            return
+        with self._lock:
+            self._buffer.extend(lines)
+            self._buffered += sum(map(len, lines))
+            self.records += len(lines)
+            if self.hold:
+                return
+            if self.durability == "record" or self._buffered >= self.flush_bytes:
+                self._flush()
+            elif self._timer is None and self.flush_seconds > 0:
+                # The last records of a slow stream should not wait for the next ones
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    # Writes out everything buffered
+    # Input: before_write (callable or None) called as before_write(block) while the file is
+    #        locked, just before a non-empty block is appended; block is a dict with the
+    #        block's "output_start" and "output_end" offsets, its "sha256", and the
+    #        "head_sha256" of its first "head_bytes" bytes
+    # Output: size of the file after the write (the end of this writer's last line when no
+    #         other process appends to the file)
+    def flush(self, before_write=None):
+        with self._lock:
+            if self._fd is None:
+                # Closed already (a flush timer that lost the race with close)
+                return None
+            return self._flush(before_write)
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            self._flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _flush(self, before_write=None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._fd is None:
+            raise ValueError("Writer is closed")
+        data = self._encode(b"".join(self._buffer)) if self._buffer else b""
+        self._buffer = []
+        self._buffered = 0
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if data and before_write is not None:
+                # Nobody else appends while the lock is held, so the block lands right here
+                start = os.lseek(self._fd, 0, os.SEEK_END)
+                before_write({
+                    "output_start": start,
+                    "output_end": start + len(data),
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                    "head_bytes": min(len(data), HEAD_BYTES),
+                    "head_sha256": hashlib.sha256(data[:HEAD_BYTES]).hexdigest(),
+                })
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            if data and self.durability != "none":
+                os.fsync(self._fd)
+            return os.lseek(self._fd, 0, os.SEEK_END)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # Bytes appended to the file for a block of lines; compressed formats override it
+    def _encode(self, data):
+        return data
@@ -0,0 +1,253 @@
+import warnings
+
+import regex as re
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# --- Pattern Analysis ---
+# Static analysis of tag patterns, done once when the dictionary is compiled.
+# Patterns are parsed with the standard library's regex parser. Anything it does not
+# understand exactly like the third party regex module (fuzzy matching, \p{..}, POSIX
+# classes, version flags, ...) is reported as "unknown" so callers fall back to always
+# running the full regex.
+
+_LITERAL = sre_constants.LITERAL
+_SUBPATTERN = sre_constants.SUBPATTERN
+_BRANCH = sre_constants.BRANCH
+_IN = sre_constants.IN
+_AT = sre_constants.AT
+_ASSERT = sre_constants.ASSERT
+_ASSERT_NOT = sre_constants.ASSERT_NOT
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+for _name in ("POSSESSIVE_REPEAT",):
+    if hasattr(sre_constants, _name):
+        _REPEATS.add(getattr(sre_constants, _name))
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+_MAX_REPEAT = sre_constants.MAX_REPEAT
+_MIN_REPEAT = sre_constants.MIN_REPEAT
+_AT_BOUNDARY = sre_constants.AT_BOUNDARY
+_ANY = sre_constants.ANY
+
+# Braces that are not a {m,n} repeat mean fuzzy matching in the regex module but a
+# literal brace to the standard library parser
+_NON_REPEAT_BRACE = re.compile(r"\{(?!\d*,?\d*\})")
+
+# Same definition of a word character the regex module uses for \b and \w
+_WORD_CHAR = re.compile(r"\w")
+
+# Upper bound on how many strings a finite pattern may expand to
+MAX_PHRASES = 4096
+
+
+# Parses a pattern with the standard library parser
+# Input: source (string) regex pattern
+# Output: parsed pattern, or None if it cannot be analysed safely
+def parse(source):
+    if _NON_REPEAT_BRACE.search(source):
+        return None
+    try:
+        with warnings.catch_warnings():
+            # FutureWarnings flag syntax (nested sets, POSIX classes) the two engines read differently
+            warnings.simplefilter("error")
+            parsed = sre_parse.parse(source)
+    except (Exception, Warning):
+        return None
+    if parsed.state.flags & (sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_LOCALE):
+        return None
+    return parsed
+
+
+# --- Required literals ---
+# Finds a set of literal substrings such that every match of the pattern (including its
+# lookahead/lookbehind context) contains at least one of them. A document containing none
+# of the literals cannot match the pattern, so the regex does not need to run at all.
+# Input: source (string) regex pattern
+# Output: frozenset of non-empty strings, or None if no such set could be derived
+def required_literals(source):
+    parsed = parse(source)
+    if parsed is None:
+        return None
+    literals = _required(list(parsed))
+    return frozenset(literals) if literals else None
+
+
+# Picks the most selective requirement: the one whose shortest literal is longest
+def _best(candidates):
+    candidates = [c for c in candidates if c and all(c)]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (min(map(len, c)), -len(c)))
+
+
+# Requirement of a sequence of parsed items: any literal run or any required child will do
+def _required(items):
+    candidates = []
+    run = []
+    for op, av in items:
+        if op is _LITERAL or (op is _IN and len(av) == 1 and av[0][0] is _LITERAL):
+            run.append(chr(av if op is _LITERAL else av[0][1]))
+            continue
+        if op is _AT or op is _ASSERT_NOT:
+            # Zero-width: the literal run on either side stays contiguous in the text
+            continue
+        if op is _ASSERT:
+            # Lookaround text must still be in the document, but it is not adjacent to the run
+            candidates.append(_required(av[1]))
+            continue
+
+        if run:
+            candidates.append({"".join(run)})
+            run = []
+        candidates.append(_required_item(op, av))
+    if run:
+        candidates.append({"".join(run)})
+    return _best(candidates)
+
+
+def _required_item(op, av):
+    if op is _SUBPATTERN:
+        _group, add_flags, _del_flags, items = av
+        if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+            return None
+        return _required(items)
+    if op is _ATOMIC_GROUP:
+        return _required(av)
+    if op is _BRANCH:
+        union = set()
+        for branch in av[1]:
+            literals = _required(branch)
+            if not literals:
+                return None
+            union |= literals
+        return union
+    if op in _REPEATS:
+        minimum, _maximum, items = av
+        return _required(items) if minimum >= 1 else None
+    if op is _IN and all(item_op is _LITERAL for item_op, _ in av):
+        # A set of plain characters (the parser also folds single-character branches into one)
+        return {chr(code) for _, code in av}
+    return None
+
+
+# --- Cost classes ---
+# Rough cost of a pattern, used to run cheap patterns first when tagging has a time budget
+#   0: whole-word phrase lists (fast path, no regex at all)
+#   1: other patterns with required literals
+#   2: contextual patterns: lookarounds, wildcard repeats such as .{0,150} or .*, anything
+#      without a usable literal, or anything the parser cannot read
+CHEAP, REGEX, CONTEXTUAL = 0, 1, 2
+
+
+# Input: source (string) regex pattern
+# Output: CHEAP, REGEX or CONTEXTUAL
+def cost_class(source):
+    if word_phrases(source) is not None:
+        return CHEAP
+    parsed = parse(source)
+    if parsed is None or _is_contextual(list(parsed)) or required_literals(source) is None:
+        return CONTEXTUAL
+    return REGEX
+
+
+def _is_contextual(items):
+    for op, av in items:
+        if op is _ASSERT or op is _ASSERT_NOT:
+            return True
+        if op in _REPEATS:
+            _minimum, maximum, repeated = av
+            if maximum > 10 and any(item_op is _ANY for item_op, _ in repeated):
+                return True
+            if _is_contextual(list(repeated)):
+                return True
+        elif op is _SUBPATTERN:
+            if _is_contextual(list(av[3])):
+                return True
+        elif op is _ATOMIC_GROUP:
+            if _is_contextual(list(av)):
+                return True
+        elif op is _BRANCH:
+            if any(_is_contextual(list(branch)) for branch in av[1]):
+                return True
+    return False
+
+
+# --- Whole-word phrase patterns ---
+# Recognises patterns of the form \b<finite set of strings>\b, e.g. \b(pet|dog|wiggles|cat)\b
+# or \b(best[- ]?friend)\b, where every string starts and ends with a word character.
+# Such a pattern can only match whole runs of \w+ tokens, so it can be counted with a
+# dictionary lookup per token instead of a regex scan.
+# Input: source (string) regex pattern
+# Output: tuple of phrases in the order the regex would prefer them at one position
+#         (earlier alternatives, then greedy repeats, win), or None
+def word_phrases(source):
+    parsed = parse(source)
+    if parsed is None:
+        return None
+    items = list(parsed)
+    if len(items) < 3 or items[0] != (_AT, _AT_BOUNDARY) or items[-1] != (_AT, _AT_BOUNDARY):
+        return None
+    phrases = _expand(items[1:-1])
+    if not phrases:
+        return None
+
+    unique = []
+    seen = set()
+    for phrase in phrases:
+        if not phrase or not _WORD_CHAR.match(phrase[0]) or not _WORD_CHAR.match(phrase[-1]):
+            return None
+        if phrase not in seen:
+            seen.add(phrase)
+            unique.append(phrase)
+    return tuple(unique)
+
+
+# Expands a sequence of parsed items into every string it can match, in priority order
+def _expand(items):
+    results = [""]
+    for op, av in items:
+        options = _expand_item(op, av)
+        if options is None or len(results) * len(options) > MAX_PHRASES:
+            return None
+        results = [prefix + option for prefix in results for option in options]
+    return results
+
+
+def _expand_item(op, av):
+    if op is _LITERAL:
+        return [chr(av)]
+    if op is _IN and all(item_op is _LITERAL for item_op, _ in av):
+        return [chr(code) for _, code in av]
+    if op is _SUBPATTERN:
+        _group, add_flags, del_flags, items = av
+        if add_flags or del_flags:
+            return None
+        return _expand(items)
+    if op is _BRANCH:
+        options = []
+        for branch in av[1]:
+            expanded = _expand(branch)
+            if expanded is None:
+                return None
+            options.extend(expanded)
+        return options if len(options) <= MAX_PHRASES else None
+    if op is _MAX_REPEAT or op is _MIN_REPEAT:
+        minimum, maximum, items = av
+        if maximum > 4:
+            return None
+        counts = range(minimum, maximum + 1)
+        if op is _MAX_REPEAT:
+            # Greedy repeats try the most repetitions first
+            counts = reversed(counts)
+        options = []
+        for count in counts:
+            expanded = _expand(list(items) * count)
+            if expanded is None:
+                return None
+            options.extend(expanded)
+        return options if len(options) <= MAX_PHRASES else None
+    return None
@@ -0,0 +1,151 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, NamedTuple
+
+# --- Pipeline ---
+# Runs jobs through a chain of stages, each on an executor that suits its kind of work
+# (a process pool for Whisper or tagging, threads for requests that wait on the network),
+# so the stages of different jobs overlap: while one file waits on the API the next one
+# is already transcribing. Stages are joined by bounded queues, and a stage only takes on
+# `limit` jobs at once (running, or finished and waiting for the next stage to accept them),
+# so a fast stage cannot pile up work in memory ahead of a slow one. Jobs leave in the order
+# they finish, and the wall-clock time of a run approaches the busy time of its slowest stage.
+
+
+class Stage(NamedTuple):
+    name: str
+    # Called as function(value) on the executor; returns the value for the next stage.
+    # Must be picklable (a module-level function) for a process pool.
+    function: Callable
+    # concurrent.futures executor (ThreadPoolExecutor or ProcessPoolExecutor)
+    executor: Any
+    # Jobs the stage holds at once
+    limit: int
+
+
+class Failed(NamedTuple):
+    stage: str
+    error: BaseException
+
+
+_DONE = object()
+# Guards the busy-seconds totals, updated from executor callback threads
+_BUSY_LOCK = threading.Lock()
+
+
+# Input: jobs (iterable of (key, value)), stages (list of Stage), capacity (int) of the
+#        queues between stages, busy (dict or None) filled with the seconds each stage spent
+#        working, summed over its jobs, by stage name
+# Output: iterator of (key, value) after the last stage, or (key, Failed) for a job that
+#         raised; a job that fails skips the stages after the one that failed
+def run_pipeline(jobs, stages, capacity=2, busy=None):
+    busy = {} if busy is None else busy
+    queues = [queue.Queue(capacity) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+    threads = [threading.Thread(target=_feed, args=(jobs, queues[0], stop), name="pipeline-feed", daemon=True)]
+    for stage, source, target in zip(stages, queues, queues[1:]):
+        busy[stage.name] = 0.0
+        threads.append(threading.Thread(
+            target=_run_stage, args=(stage, source, target, stop, busy), name=f"pipeline-{stage.name}", daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # A consumer that stops early (or an interrupt) stops feeding new jobs
+        stop.set()
+
+
+def _feed(jobs, target, stop):
+    try:
+        for job in jobs:
+            if stop.is_set():
+                break
+            _put(target, job, stop)
+    finally:
+        _put(target, _DONE, stop)
+
+
+def _put(target, item, stop):
+    while True:
+        try:
+            target.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if stop.is_set() and item is not _DONE:
+                return
+
+
+# Submits jobs from source to the stage's executor and forwards them to target as they finish
+def _run_stage(stage, source, target, stop, busy):
+    slots = threading.Semaphore(stage.limit)
+    finished = queue.Queue()
+    submitted = 0
+
+    def forward():
+        forwarded = 0
+        total = None
+        while total is None or forwarded < total:
+            item = finished.get()
+            if isinstance(item, int):
+                # Number of jobs submitted in all
+                total = item
+                continue
+            _put(target, item, stop)
+            slots.release()
+            forwarded += 1
+        _put(target, _DONE, stop)
+
+    forwarder = threading.Thread(target=forward, name=f"pipeline-{stage.name}-out", daemon=True)
+    forwarder.start()
+    # Set once the executor refuses work (e.g. BrokenProcessPool after a worker was killed);
+    # every later job fails with it instead of the stage thread dying
+    broken = None
+    try:
+        while True:
+            item = source.get()
+            if item is _DONE:
+                break
+            key, value = item
+            slots.acquire()
+            submitted += 1
+            if broken is not None:
+                value = Failed(stage.name, broken)
+            elif stop.is_set():
+                value = Failed(stage.name, RuntimeError("Pipeline stopped"))
+            if isinstance(value, Failed):
+                finished.put((key, value))
+                continue
+            try:
+                future = stage.executor.submit(_timed, stage.function, value)
+            except Exception as e:
+                broken = e
+                finished.put((key, Failed(stage.name, e)))
+                continue
+            future.add_done_callback(lambda future, key=key: finished.put(_outcome(stage, key, future, busy)))
+    finally:
+        # The forwarder only finishes (and passes _DONE on) once it knows the total
+        finished.put(submitted)
+
+
+# Runs on the executor, so the time counts work only, not waiting for a free worker
+def _timed(function, value):
+    started = time.monotonic()
+    result = function(value)
+    return time.monotonic() - started, result
+
+
+def _outcome(stage, key, future, busy):
+    try:
+        seconds, result = future.result()
+    except BaseException as e:
+        return key, Failed(stage.name, e)
+    with _BUSY_LOCK:
+        busy[stage.name] += seconds
+    return key, result
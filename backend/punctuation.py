@@ -0,0 +1,118 @@
+import difflib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import regex as re
+
+# --- Windowed punctuation ---
+# A long transcript sent as one prompt gets cut off at the completion's max_tokens, and one
+# request carries all the latency. The raw text is instead split into windows of at most
+# WINDOW_TOKENS tokens that overlap by OVERLAP_WORDS words, the windows are punctuated
+# concurrently (at most CONCURRENCY requests in flight), and the results are stitched back
+# in order. Where two neighbouring results overlap, the cut is placed in the middle of the
+# longest run of words both agree on, so nothing is lost or repeated and the output only
+# depends on the window results, not on the order they arrive in.
+
+# Input tokens per window; the formatted window has to fit in the completion's max_tokens
+WINDOW_TOKENS = int(os.getenv("MEMORY_FORGE_PUNCTUATION_WINDOW_TOKENS", "1000"))
+OVERLAP_WORDS = int(os.getenv("MEMORY_FORGE_PUNCTUATION_OVERLAP_WORDS", "30"))
+CONCURRENCY = int(os.getenv("MEMORY_FORGE_PUNCTUATION_CONCURRENCY", "4"))
+
+_WORD = re.compile(r"\S+")
+# Word with punctuation and case stripped, for matching overlaps
+_NORMALISE = re.compile(r"[^\w']+")
+
+
+# Counts tokens the way the chat model does when tiktoken is available, else estimates
+# about 4 tokens per 3 words
+def token_counter(model):
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception:
+        return lambda text: len(text.split()) * 4 // 3 + 1
+    return lambda text: len(encoding.encode(text))
+
+
+# Splits text into overlapping windows of whole words
+# Input: text (string), count_tokens (callable text -> int), window_tokens (int), overlap (int words)
+# Output: list of window strings; a text that fits in one window comes back as [text]
+def split_windows(text, count_tokens, window_tokens=WINDOW_TOKENS, overlap=OVERLAP_WORDS):
+    words = text.split()
+    if not words or count_tokens(text) <= window_tokens:
+        return [text]
+
+    costs = [count_tokens(" " + word) for word in words]
+    windows = []
+    start = 0
+    while True:
+        end = start
+        tokens = 0
+        while end < len(words) and (end == start or tokens + costs[end] <= window_tokens):
+            tokens += costs[end]
+            end += 1
+        windows.append(" ".join(words[start:end]))
+        if end >= len(words):
+            return windows
+        # Step back for the overlap, but always move forward
+        start = max(end - overlap, start + 1)
+
+
+# Joins formatted windows, resolving each overlap between neighbours
+# Input: parts (list of strings) formatted windows in order
+# Output: the stitched text
+def stitch(parts, overlap=OVERLAP_WORDS):
+    text = parts[0]
+    for part in parts[1:]:
+        text = _stitch_pair(text, part, overlap)
+    return text
+
+
+def _stitch_pair(left, right, overlap):
+    # Search a little more than the overlap on both sides; the model may add or drop words
+    span = overlap * 2
+    left_words = list(_WORD.finditer(left))[-span:]
+    right_words = list(_WORD.finditer(right))[:span]
+    if not left_words or not right_words:
+        return _join(left, right)
+
+    left_keys = [_key(match.group()) for match in left_words]
+    right_keys = [_key(match.group()) for match in right_words]
+    matcher = difflib.SequenceMatcher(None, left_keys, right_keys, autojunk=False)
+    i, j, size = matcher.find_longest_match(0, len(left_keys), 0, len(right_keys))
+    if size == 0:
+        # Nothing in common: the model rewrote the overlap; drop the repeated words from
+        # the right window so the overlap appears once
+        skip = min(overlap, len(right_words) - 1)
+        return _join(left, right[right_words[skip].start():] if skip > 0 else right)
+
+    # Cut in the middle of the agreed run: left up to it, right from it
+    middle = size // 2
+    cut_left = left_words[i + middle].start()
+    cut_right = right_words[j + middle].start()
+    return _join(left[:cut_left], right[cut_right:])
+
+
+def _key(word):
+    return _NORMALISE.sub("", word.lower())
+
+
+def _join(left, right):
+    left = left.rstrip()
+    right = right.lstrip()
+    if not left or not right:
+        return left + right
+    return left + " " + right
+
+
+# Punctuates a text window by window
+# Input: text (string) raw text, complete (callable window string -> formatted string),
+#        count_tokens (callable text -> int), concurrency (int) requests in flight
+# Output: formatted text of the whole input
+def punctuate_windows(text, complete, count_tokens, concurrency=CONCURRENCY):
+    windows = split_windows(text, count_tokens)
+    if len(windows) == 1:
+        return complete(windows[0])
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(windows)))) as pool:
+        parts = list(pool.map(complete, windows))
+    return stitch(parts)
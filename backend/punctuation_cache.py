@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# --- Punctuation cache ---
+# On-disk cache of punctuation results, so re-processing a transcript with another title,
+# instruction or mode does not pay for the same OpenAI requests again. Entries live in one
+# SQLite file and are keyed by the SHA-256 of everything that decides the answer: the raw
+# text of the window, the prompt template, the model, the temperature and max_tokens.
+# The file is kept under MEMORY_FORGE_PUNCTUATION_CACHE_MB by deleting the least recently
+# used entries; a hit refreshes the entry. 0 MB turns the cache off.
+#
+# With a temperature above 0 the model gives a different answer every time, and the cache
+# pins whichever answer came first. MEMORY_FORGE_PUNCTUATION_DETERMINISTIC=1 (see process.py)
+# punctuates at temperature 0 so a cached result is the one a new request would return.
+
+CACHE_PATH = Path(os.getenv("MEMORY_FORGE_PUNCTUATION_CACHE") or Path(__file__).with_name("punctuation_cache.sqlite3"))
+MAX_BYTES = int(float(os.getenv("MEMORY_FORGE_PUNCTUATION_CACHE_MB", "256")) * 1024 * 1024)
+
+# Bump when the key or the stored value changes meaning; older entries then never hit
+CACHE_FORMAT = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS punctuation (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS punctuation_used ON punctuation (used);
+"""
+
+
+# Output: hex SHA-256 identifying one punctuation request
+def cache_key(text, prompt, model, temperature, max_tokens):
+    settings = json.dumps([CACHE_FORMAT, prompt, model, temperature, max_tokens])
+    return hashlib.sha256(f"{settings}\n{text}".encode("utf-8")).hexdigest()
+
+
+class PunctuationCache:
+    # Input: path (Path) of the SQLite file, max_bytes (int) size cap, 0 disables the cache
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Opened on first use; shared by the worker's threads behind the lock
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    # Output: the cached result for key, or None on a miss
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute("SELECT result FROM punctuation WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE punctuation SET used = ? WHERE key = ?", (time.time(), key))
+                    connection.commit()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    # Stores a result; a cache that cannot be written is not an error
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        size = len(key) + len(result.encode("utf-8"))
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO punctuation (key, result, bytes, used) VALUES (?, ?, ?, ?)",
+                    (key, result, size, time.time()),
+                )
+                self._evict(connection)
+                connection.commit()
+            except sqlite3.Error:
+                pass
+
+    # Output: dict with hits, misses, entries and bytes stored
+    def stats(self):
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                try:
+                    entries, size = self._connect().execute(
+                        "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM punctuation"
+                    ).fetchone()
+                except sqlite3.Error:
+                    pass
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute("DELETE FROM punctuation")
+                connection.commit()
+            except sqlite3.Error:
+                pass
+
+    def _connect(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Other processes (a second worker, the CLI) may use the same file
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    # Deletes least recently used entries until the stored results fit in max_bytes
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM punctuation").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in connection.execute("SELECT key, bytes FROM punctuation ORDER BY used"):
+            if total - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        connection.executemany("DELETE FROM punctuation WHERE key = ?", doomed)
+
+
+# Process-wide cache used by process.py
+PUNCTUATION_CACHE = PunctuationCache()
@@ -0,0 +1,148 @@
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Stub chat completions server ---
+# Mimics the OpenAI chat completions endpoint closely enough to exercise punctuation
+# without network access or API costs:
+#   python stub_openai.py [port] [delay_seconds] [failure_rate]
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub python process.py ...
+# The "formatted" text is the transcript from the prompt with its first letter capitalised
+# and a final period, so output can be compared with input word for word. Every request
+# waits delay_seconds; failure_rate (0..1) of the requests get a 429 with Retry-After.
+# GET /stats reports the number of requests and the most that were in flight at once.
+
+_PROMPT_START = "\n\n"
+_PROMPT_END = "\n\nFormatted version:"
+
+
+class StubState:
+    def __init__(self, delay=0.0, failure_rate=0.0):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+# Output: the transcript part of a punctuation prompt (the whole prompt if it is not one)
+def transcript_from_prompt(prompt):
+    start = prompt.find(_PROMPT_START)
+    end = prompt.rfind(_PROMPT_END)
+    if start == -1 or end <= start:
+        return prompt
+    return prompt[start + len(_PROMPT_START):end]
+
+
+def stub_format(text):
+    text = " ".join(text.split())
+    if not text:
+        return text
+    return text[0].upper() + text[1:] + ("" if text.endswith(".") else ".")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.state.lock:
+                body = {
+                    "requests": self.state.requests,
+                    "failures": self.state.failures,
+                    "max_in_flight": self.state.max_in_flight,
+                }
+            self._send(200, body)
+        else:
+            self._send(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "Not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            fail = random.random() < state.failure_rate
+            if fail:
+                state.failures += 1
+        try:
+            time.sleep(state.delay)
+            if fail:
+                self._send(
+                    429,
+                    {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    {"Retry-After": "0.1"},
+                )
+                return
+
+            prompt = "".join(
+                message.get("content") or "" for message in request.get("messages", []) if message.get("role") == "user"
+            )
+            content = stub_format(transcript_from_prompt(prompt))
+            prompt_tokens = len(prompt.split())
+            completion_tokens = len(content.split())
+            self._send(200, {
+                "id": f"chatcmpl-stub-{state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Starts the stub on a background thread
+# Input: port (int, 0 picks a free one), delay (float seconds), failure_rate (float 0..1)
+# Output: (server, base_url); call server.shutdown() to stop it
+def start_stub(port=0, delay=0.0, failure_rate=0.0):
+    handler = type("Handler", (StubHandler,), {"state": StubState(delay, failure_rate)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, base_url = start_stub(port, delay, failure_rate)
+    print(f"Stub chat completions server on {base_url} (delay {delay}s, failure rate {failure_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,667 @@
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+import regex as re
+
+from pattern_analysis import CONTEXTUAL, cost_class, required_literals, word_phrases
+
+# --- Tag Engine ---
+# Compiles a tag dictionary (category -> subcategory -> list of regex strings) exactly once
+# into a frozen structure that every tagging call reuses. Compiling per call means hundreds
+# of patterns get looked up in (or evicted from) the regex module's small internal cache
+# for every chunk we tag.
+
+
+# A single compiled dictionary entry
+#   tag: "category.subcategory" (or just "category" for flat categories)
+#   index: position of the pattern inside its subcategory list (-1 for the anchors of a
+#          proximity rule that scores this tag)
+#   source: the raw pattern string as written in the dictionary
+#   literals: substrings of which at least one must appear in any text the pattern matches,
+#             or None when the pattern has to run on every text
+#   phrases: the whole-word phrases the pattern reduces to (fast path), or None
+#   cost: pattern_analysis cost class; cheaper classes run first under a time budget
+#   regex: the compiled pattern object; fast path patterns are only compiled when something
+#          actually asks for their regex
+class CompiledPattern(NamedTuple):
+    tag: str
+    index: int
+    source: str
+    literals: frozenset = None
+    phrases: tuple = None
+    cost: int = CONTEXTUAL
+
+    @property
+    def regex(self):
+        return _compile(self.source)
+
+
+# Compiled patterns by source. The regex module's own cache holds fewer entries than the
+# dictionary has patterns, so it cannot be relied on to keep them compiled.
+_COMPILED = {}
+
+
+def _compile(source):
+    compiled = _COMPILED.get(source)
+    if compiled is None:
+        compiled = _COMPILED[source] = re.compile(source)
+    return compiled
+
+
+# Static analysis of one pattern: (literals, phrases, cost)
+def analyse(source):
+    return required_literals(source), word_phrases(source), cost_class(source)
+
+
+# A run of word characters, with the same definition of \w that \b uses
+_TOKEN = re.compile(r"\w+")
+
+
+# --- Dictionary helpers ---
+# Top-level dictionary key holding the proximity rules (see ProximityRule)
+RULES_KEY = "_proximity_rules"
+
+
+# Walks a tag dictionary and yields (category, subcategory, tag, patterns) for every pattern list.
+# Most categories map subcategory names to lists, but a category can also be a flat list of
+# patterns (e.g. "routines_plans"); those are tagged with the bare category name and
+# subcategory None. Keys starting with "_" hold settings such as the proximity rules under
+# RULES_KEY and are skipped.
+def iter_subcategories(dictionary):
+    for category, subcategories in dictionary.items():
+        if category.startswith("_"):
+            continue
+        if isinstance(subcategories, dict):
+            for subcategory, patterns in subcategories.items():
+                yield category, subcategory, f"{category}.{subcategory}", patterns
+        else:
+            yield category, None, category, subcategories
+
+
+# Content hash of a dictionary, used as its version string
+# Input: dictionary (dict) in the same shape as regex_tag_patterns
+# Output: 16 hex characters that change whenever any category, subcategory or pattern changes
+def dictionary_version(dictionary):
+    canonical = json.dumps(dictionary, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+# Detects backreferences, named groups and recursion, which break when patterns are joined
+# into one alternation (see ProximityRule.anchor_regex)
+_BACKREFERENCE = re.compile(r"\\[1-9]|\\g<|\(\?P[<=>]|\(\?<\w|\(\?&|\(\?[+-]?\d")
+
+
+# --- Phrase matcher (fast path) ---
+# Counts patterns that reduce to a finite set of whole-word phrases (see
+# pattern_analysis.word_phrases) with one tokenization of the text and hash lookups.
+# A \b...\b match always starts at a token start and ends at a token end, so at each token
+# the candidates are the text slices covering 1..n whole tokens. When several phrases of
+# one pattern fit at the same token the regex would take the earliest alternative, and
+# after a match findall resumes at its end; both rules are replayed per pattern, so counts
+# are identical to findall.
+class PhraseMatcher:
+    # Input: patterns (iterable of CompiledPattern) whose phrases are not None
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+
+        # phrase -> tuple of (pattern position, priority, number of tokens)
+        index = {}
+        # First tokens of phrases spanning more than one token
+        self._multi_token_starts = set()
+        self._max_tokens = 1
+        for position, pattern in enumerate(self.patterns):
+            for priority, phrase in enumerate(pattern.phrases):
+                tokens = _TOKEN.findall(phrase)
+                index.setdefault(phrase, []).append((position, priority, len(tokens)))
+                if len(tokens) > 1:
+                    self._multi_token_starts.add(tokens[0])
+                    self._max_tokens = max(self._max_tokens, len(tokens))
+        self._index = {phrase: tuple(hits) for phrase, hits in index.items()}
+
+    # Input: text_lower (string) already lowercased
+    # Output: list of match counts, aligned with self.patterns
+    def count(self, text_lower):
+        counts = [0] * len(self.patterns)
+        # Token index where each pattern's previous match ended
+        last_end = [0] * len(self.patterns)
+        index = self._index
+        spans = [match.span() for match in _TOKEN.finditer(text_lower)]
+
+        for position, (start, end) in enumerate(spans):
+            token = text_lower[start:end]
+            hits = index.get(token, ())
+            if token in self._multi_token_starts:
+                hits = list(hits)
+                for size in range(2, min(self._max_tokens, len(spans) - position) + 1):
+                    hits.extend(index.get(text_lower[start:spans[position + size - 1][1]], ()))
+            if not hits:
+                continue
+
+            # Earliest alternative per pattern at this token
+            best = {}
+            for pattern_position, priority, size in hits:
+                current = best.get(pattern_position)
+                if current is None or priority < current[0]:
+                    best[pattern_position] = (priority, size)
+            for pattern_position, (_priority, size) in best.items():
+                if position >= last_end[pattern_position]:
+                    counts[pattern_position] += 1
+                    last_end[pattern_position] = position + size
+        return counts
+
+
+# --- Proximity rules ---
+# Context rules declared in the dictionary under RULES_KEY, e.g.
+#   {"name": "military_near_location", "anchors": ["iraq|syria"],
+#    "near": "activities_experiences.military", "distance": 150,
+#    "scores": {"activities_experiences.military": 2, "societal_context.location": 1}}
+# Every anchor match with a match of one of the `near` tag's patterns lying entirely within
+# `distance` characters of the anchor's start adds the listed points. All anchors of a rule
+# are found in one combined pass, and the `near` tag's matches are found once per text and
+# indexed, so each anchor is a binary search instead of a rescan of the window around it.
+class ProximityRule(NamedTuple):
+    name: str
+    anchors: tuple
+    near: str
+    distance: int
+    # ((tag, points), ...)
+    scores: tuple
+
+    # Every tag the rule reads or adds points to
+    @property
+    def tags(self):
+        return frozenset([self.near, *(tag for tag, _points in self.scores)])
+
+    # One alternation of all anchors
+    @property
+    def anchor_regex(self):
+        return _compile("|".join(f"(?:{anchor})" for anchor in self.anchors))
+
+
+# Reads and validates the proximity rules of a dictionary
+# Input: dictionary (dict) in the same shape as regex_dictionary.json
+# Output: tuple of ProximityRule; raises ValueError for a malformed rule
+def parse_rules(dictionary):
+    rules = []
+    for position, rule in enumerate(dictionary.get(RULES_KEY, ())):
+        name = rule.get("name", f"rule {position}") if isinstance(rule, dict) else f"rule {position}"
+        try:
+            anchors = tuple(rule["anchors"])
+            near = rule["near"]
+            distance = int(rule["distance"])
+            scores = tuple((tag, int(points)) for tag, points in rule["scores"].items())
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Proximity rule {name!r} needs anchors, near, distance and scores: {e}") from None
+        if not anchors or any(_BACKREFERENCE.search(anchor) for anchor in anchors):
+            raise ValueError(f"Proximity rule {name!r} needs anchors without backreferences or named groups")
+        rules.append(ProximityRule(name, anchors, near, distance, scores))
+    return tuple(rules)
+
+
+# Sorted index of match spans answering "is there a match entirely inside [low, high)"
+class SpanIndex:
+    # Input: spans (iterable of (start, end))
+    def __init__(self, spans):
+        spans = sorted(spans)
+        self.starts = [start for start, _end in spans]
+        # min_ends[i]: smallest end of the spans from i on
+        self.min_ends = list(itertools.accumulate(reversed([end for _start, end in spans]), min))[::-1]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def any_within(self, low, high):
+        i = bisect_left(self.starts, low)
+        return i < len(self.min_ends) and self.min_ends[i] <= high
+
+
+class TagEngine:
+    # Input: dictionary (dict) mapping category -> subcategory -> list of pattern strings,
+    #        analysis (dict) optional tag -> (patterns, [(literals, phrases, cost), ...]) from an
+    #        earlier engine; subcategories whose pattern list is unchanged reuse it
+    def __init__(self, dictionary, analysis=None):
+        analysis = analysis or {}
+        categories = {}
+        subcategories = {}
+        # tag -> (patterns, [(literals, phrases, cost), ...]), kept for snapshots
+        self.analysis = {}
+
+        for category, subcategory, tag, patterns in iter_subcategories(dictionary):
+            patterns = tuple(patterns)
+            previous = analysis.get(tag)
+            if previous is not None and tuple(previous[0]) == patterns:
+                results = previous[1]
+            else:
+                results = [analyse(pattern) for pattern in patterns]
+            self.analysis[tag] = (patterns, results)
+
+            compiled = tuple(
+                CompiledPattern(tag, index, pattern, *result)
+                for index, (pattern, result) in enumerate(zip(patterns, results))
+            )
+            for pattern in compiled:
+                if pattern.phrases is None:
+                    # Compile everything the regex path needs up front
+                    _compile(pattern.source)
+            subcategories[tag] = compiled
+            if subcategory is None:
+                categories[category] = compiled
+            else:
+                categories.setdefault(category, {})[subcategory] = compiled
+
+        # Version of the dictionary this engine was compiled from
+        self.version = dictionary_version(dictionary)
+        # Proximity rules as declared (kept for snapshots) and compiled
+        self.rule_definitions = tuple(dictionary.get(RULES_KEY, ()))
+        self.rules = parse_rules(dictionary)
+        for rule in self.rules:
+            # Compile the anchors up front, like the regex path patterns
+            rule.anchor_regex
+        # Tags the rules read or score; they are always rescored together
+        self.rule_tags = frozenset().union(*(rule.tags for rule in self.rules))
+        # category -> subcategory -> tuple of CompiledPattern (read-only views)
+        self.categories = MappingProxyType({
+            category: MappingProxyType(value) if isinstance(value, dict) else value
+            for category, value in categories.items()
+        })
+        # "category.subcategory" -> tuple of CompiledPattern, in dictionary order
+        self.subcategories = MappingProxyType(subcategories)
+
+        # Patterns classified at load time: whole-word phrase lists take the fast path,
+        # everything else goes through the regex module
+        self.fast_path = tuple(pattern for pattern in self.patterns() if pattern.phrases is not None)
+        # frozenset of tags (None for all tags) -> (PhraseMatcher, plan), see _plan()
+        self._plans = {}
+        self._plan(None)
+
+    # Every compiled pattern, in dictionary order
+    def patterns(self):
+        for compiled in self.subcategories.values():
+            yield from compiled
+
+    # Matching plan for all tags, or only for a subset of them
+    # Output: (PhraseMatcher for the fast path patterns of those tags,
+    #          dict of tag -> (positions in that matcher, patterns that need the regex))
+    def _plan(self, tags):
+        key = None if tags is None else frozenset(tags)
+        plan = self._plans.get(key)
+        if plan is None:
+            selected = [tag for tag in self.subcategories if key is None or tag in key]
+            fast_path = [
+                pattern for tag in selected for pattern in self.subcategories[tag] if pattern.phrases is not None
+            ]
+            fast_positions = {}
+            for position, pattern in enumerate(fast_path):
+                fast_positions.setdefault(pattern.tag, []).append(position)
+            plan = self._plans[key] = (
+                PhraseMatcher(fast_path),
+                {
+                    tag: (
+                        tuple(fast_positions.get(tag, ())),
+                        tuple(pattern for pattern in self.subcategories[tag] if pattern.phrases is None),
+                    )
+                    for tag in selected
+                },
+            )
+        return plan
+
+    # Counts matches per tag the same way re.findall would
+    # Whole-word phrase patterns are counted by the PhraseMatcher in one pass over the tokens.
+    # The remaining patterns are skipped when none of their required literals (see
+    # pattern_analysis) is in the text; each literal is searched for at most once.
+    # With threads > 1 the remaining regex patterns run on a thread pool with the regex
+    # module's concurrent=True, which releases the GIL while matching, while the phrase
+    # matcher runs on the calling thread. Each pattern still scans the whole text, so the
+    # counts are exactly the serial ones.
+    # A regex pattern that runs longer than `timeout` seconds is abandoned (it counts 0) and
+    # appended to `skipped`, so one pathological pattern and input cannot stall a batch.
+    # With a `budget` (seconds for the whole call) the phrase fast path runs first, then the
+    # regex patterns from cheapest to most expensive cost class; once the budget is spent the
+    # pattern running is cut short and the remaining ones are skipped (and appended to `skipped`).
+    # Input: text_lower (string) already lowercased, threads (int or None) for parallel mode,
+    #        tags (iterable of tags or None) to count only some subcategories,
+    #        timeout (float or None) per regex pattern, skipped (list or None),
+    #        budget (float or None) for the whole call
+    # Output: dict of tag -> number of matches, only for tags with at least one match,
+    #         in dictionary order
+    def count(self, text_lower, threads=None, tags=None, timeout=None, skipped=None, budget=None):
+        deadline = time.monotonic() + budget if budget is not None else None
+        phrase_matcher, plan = self._plan(tags)
+        present = {}
+        candidates = [
+            pattern
+            for _fast_positions, regex_patterns in plan.values()
+            for pattern in regex_patterns
+            if pattern.literals is None or _any_present(pattern.literals, text_lower, present)
+        ]
+        candidates.sort(key=lambda pattern: pattern.cost)
+        skipped = skipped if skipped is not None else []
+
+        if threads and threads > 1 and candidates:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = pool.map(
+                    lambda pattern: _findall_count(pattern, text_lower, timeout, deadline, skipped, concurrent=True),
+                    candidates,
+                )
+                phrase_counts = phrase_matcher.count(text_lower)
+                regex_counts = dict(zip(candidates, results))
+        else:
+            phrase_counts = phrase_matcher.count(text_lower)
+            regex_counts = {
+                pattern: _findall_count(pattern, text_lower, timeout, deadline, skipped) for pattern in candidates
+            }
+
+        scores = {}
+        for tag, (fast_positions, regex_patterns) in plan.items():
+            match_count = 0
+            for position in fast_positions:
+                match_count += phrase_counts[position]
+            for pattern in regex_patterns:
+                match_count += regex_counts.get(pattern, 0)
+            if match_count > 0:
+                scores[tag] = match_count
+        return scores
+
+    # Reference implementation of count(): one findall per pattern, no prefiltering
+    def count_findall(self, text_lower):
+        scores = {}
+        for tag, compiled in self.subcategories.items():
+            match_count = 0
+            for pattern in compiled:
+                match_count += len(pattern.regex.findall(text_lower))
+            if match_count > 0:
+                scores[tag] = match_count
+        return scores
+
+    # Points the proximity rules add on top of count()
+    # Rules still to run once the `deadline` has passed are skipped, and their anchors are
+    # appended to `skipped` under every tag they score, like patterns count() skips.
+    # Input: text_lower (string) already lowercased, tags (iterable of tags or None) to run
+    #        only the rules involving some subcategories, timeout (float or None) per
+    #        pattern, skipped (list or None) as in count(), deadline (time.monotonic()
+    #        value or None) shared with count() under a budget
+    # Output: dict of tag -> points, only for tags that got some
+    def rule_scores(self, text_lower, tags=None, timeout=None, skipped=None, deadline=None):
+        wanted = None if tags is None else set(tags)
+        skipped = skipped if skipped is not None else []
+        indexes = {}
+        points = {}
+        for rule in self.rules:
+            if wanted is not None and not wanted & rule.tags:
+                continue
+            rule_timeout = _pattern_timeout(timeout, deadline)
+            if rule_timeout is not None and rule_timeout <= 0:
+                skipped.extend(CompiledPattern(tag, -1, rule.anchor_regex.pattern) for tag, _points in rule.scores)
+                continue
+            try:
+                anchors = [match.start() for match in rule.anchor_regex.finditer(text_lower, timeout=rule_timeout)]
+            except TimeoutError:
+                skipped.extend(CompiledPattern(tag, -1, rule.anchor_regex.pattern) for tag, _points in rule.scores)
+                continue
+            if not anchors:
+                continue
+
+            index = indexes.get(rule.near)
+            if index is None:
+                index = indexes[rule.near] = SpanIndex(
+                    span
+                    for pattern in self.subcategories.get(rule.near, ())
+                    for span in _finditer_spans(pattern, text_lower, _pattern_timeout(timeout, deadline), skipped)
+                )
+            hits = sum(index.any_within(max(0, start - rule.distance), start + rule.distance) for start in anchors)
+            if hits:
+                for tag, rule_points in rule.scores:
+                    points[tag] = points.get(tag, 0) + hits * rule_points
+        return points
+
+    # Which patterns take the phrase fast path and which run through the regex module
+    # Output: dict with the number of patterns on each path and one entry per pattern
+    def fast_path_report(self):
+        patterns = [
+            {
+                "tag": pattern.tag,
+                "index": pattern.index,
+                "source": pattern.source,
+                "fast_path": pattern.phrases is not None,
+            }
+            for pattern in self.patterns()
+        ]
+        fast = sum(entry["fast_path"] for entry in patterns)
+        return {"fast_path": fast, "regex": len(patterns) - fast, "patterns": patterns}
+
+    def __repr__(self):
+        return f"<TagEngine version={self.version} tags={len(self.subcategories)}>"
+
+
+# Number of findall matches, or 0 (recording the pattern in skipped) when the pattern runs
+# past `timeout` seconds or the `deadline` (time.monotonic() value)
+def _findall_count(pattern, text_lower, timeout, deadline, skipped, concurrent=False):
+    timeout = _pattern_timeout(timeout, deadline)
+    if timeout is not None and timeout <= 0:
+        skipped.append(pattern)
+        return 0
+    try:
+        return len(pattern.regex.findall(text_lower, concurrent=concurrent, timeout=timeout))
+    except TimeoutError:
+        skipped.append(pattern)
+        return 0
+
+
+# Seconds the next pattern may run: `timeout`, or less when the `deadline` (time.monotonic()
+# value) comes first; 0 or below once the deadline has passed
+def _pattern_timeout(timeout, deadline):
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+# Spans of the pattern's matches, or those found so far (recording the pattern in skipped)
+# when it runs past `timeout` seconds
+def _finditer_spans(pattern, text_lower, timeout, skipped):
+    spans = []
+    if timeout is not None and timeout <= 0:
+        skipped.append(pattern)
+        return spans
+    try:
+        for match in pattern.regex.finditer(text_lower, timeout=timeout):
+            spans.append(match.span())
+    except TimeoutError:
+        skipped.append(pattern)
+    return spans
+
+
+# True if any of the literals occurs in the text; results are memoised in `present`
+def _any_present(literals, text, present):
+    for literal in literals:
+        found = present.get(literal)
+        if found is None:
+            found = present[literal] = literal in text
+        if found:
+            return True
+    return False
+
+
+# --- Loading from disk ---
+# Bump whenever the analysis stored in snapshots changes shape or meaning
+SNAPSHOT_FORMAT = 2
+# Snapshots kept per cache directory; the oldest ones are removed first
+MAX_SNAPSHOTS = 8
+
+
+# Reads a tag dictionary from a JSON file
+# Input: path (string or Path) to a JSON file shaped like regex_dictionary.json
+# Output: dict of category -> subcategory -> list of pattern strings
+def load_dictionary(path):
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+# Builds the engine for a dictionary file, reusing an on-disk snapshot of the pattern analysis
+# Snapshots are keyed by the content hash of the file, so an unchanged dictionary skips the
+# analysis entirely. For a changed dictionary the newest snapshot is the starting point and
+# only subcategories whose pattern lists changed are analysed again. Only the patterns that
+# need the regex path are compiled up front, so loading stays fast either way.
+# Input: path (string or Path) to the JSON dictionary,
+#        cache_dir (string or Path) for snapshots (default: "tag_engine_cache" next to the file)
+# Output: TagEngine
+def load_engine(path, cache_dir=None):
+    path = Path(path)
+    data = path.read_bytes()
+    dictionary = json.loads(data.decode("utf-8"))
+
+    cache_dir = Path(cache_dir) if cache_dir else snapshot_dir(path)
+    snapshot_path = cache_dir / f"{hashlib.sha256(data).hexdigest()[:16]}.pickle"
+
+    snapshot = _read_snapshot(snapshot_path)
+    if snapshot is None:
+        snapshots = sorted(cache_dir.glob("*.pickle"), key=_mtime, reverse=True)
+        snapshot = next(filter(None, map(_read_snapshot, snapshots)), None)
+        engine = TagEngine(dictionary, snapshot and snapshot["analysis"])
+        _write_snapshot(snapshot_path, engine)
+    else:
+        engine = TagEngine(dictionary, snapshot["analysis"])
+    return engine
+
+
+# Default snapshot directory for a dictionary file
+def snapshot_dir(path):
+    return Path(path).parent / "tag_engine_cache"
+
+
+# Pattern lists of an earlier dictionary version, recovered from the snapshot cache
+# Input: version (string) as in TagEngine.version, cache_dirs (iterable of directories)
+# Output: dict of tag -> tuple of pattern strings plus RULES_KEY -> the proximity rules (None
+#         if the snapshot predates them), or None if no snapshot has that version
+def snapshot_patterns(version, cache_dirs):
+    for cache_dir in cache_dirs:
+        for path in Path(cache_dir).glob("*.pickle"):
+            snapshot = _read_snapshot(path)
+            if snapshot is not None and snapshot.get("version") == version:
+                patterns = {tag: patterns for tag, (patterns, _results) in snapshot["analysis"].items()}
+                patterns[RULES_KEY] = snapshot.get("rules")
+                return patterns
+    return None
+
+
+# Tags whose pattern lists were added, removed or edited between two versions, plus every
+# tag involved in the proximity rules when those changed
+# Input: old_patterns (dict as returned by snapshot_patterns), engine (TagEngine) for the new version
+# Output: set of tags
+def changed_tags(old_patterns, engine):
+    changed = {tag for tag in old_patterns if tag != RULES_KEY and tag not in engine.subcategories}
+    for tag, compiled in engine.subcategories.items():
+        if tuple(old_patterns.get(tag, ())) != tuple(pattern.source for pattern in compiled):
+            changed.add(tag)
+
+    old_rules = old_patterns.get(RULES_KEY)
+    if old_rules is None or tuple(old_rules) != engine.rule_definitions:
+        changed |= engine.rule_tags
+        try:
+            changed |= frozenset().union(*(rule.tags for rule in parse_rules({RULES_KEY: old_rules or ()})))
+        except ValueError:
+            pass
+    return changed
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0
+
+
+# Output: the snapshot dict, or None if it is missing, unreadable or from another format
+def _read_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("python") != sys.version_info[:2]:
+        return None
+    return snapshot
+
+
+# Writes a snapshot atomically and trims old ones; a read-only cache directory is not an error
+def _write_snapshot(path, engine):
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "python": sys.version_info[:2],
+        "version": engine.version,
+        "analysis": engine.analysis,
+        "rules": engine.rule_definitions,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        for old in sorted(path.parent.glob("*.pickle"), key=_mtime, reverse=True)[MAX_SNAPSHOTS:]:
+            old.unlink()
+    except OSError:
+        pass
+
+
+# --- Profiling ---
+# Measures what every pattern costs when run through the regex module over a corpus
+# Fast path patterns are profiled too (the report marks them) since they fall back to the
+# regex if the dictionary entry is edited into something the fast path cannot handle.
+# Input: engine (TagEngine), texts (iterable of strings), timeout (float or None) per
+#        pattern and text
+# Output: report dict with corpus totals and one entry per pattern, slowest first
+def profile_patterns(engine, texts, timeout=None):
+    patterns = list(engine.patterns())
+    seconds = [0.0] * len(patterns)
+    matches = [0] * len(patterns)
+    timeouts = [0] * len(patterns)
+    text_count = 0
+    characters = 0
+
+    for text in texts:
+        text_lower = text.lower()
+        text_count += 1
+        characters += len(text_lower)
+        for position, pattern in enumerate(patterns):
+            start = time.perf_counter()
+            try:
+                matches[position] += len(pattern.regex.findall(text_lower, timeout=timeout))
+            except TimeoutError:
+                timeouts[position] += 1
+            seconds[position] += time.perf_counter() - start
+
+    total = sum(seconds) or 1.0
+    entries = [
+        {
+            "tag": pattern.tag,
+            "index": pattern.index,
+            "source": pattern.source,
+            "fast_path": pattern.phrases is not None,
+            "seconds": round(seconds[position], 6),
+            "share": round(seconds[position] / total, 4),
+            "matches": matches[position],
+            "timeouts": timeouts[position],
+        }
+        for position, pattern in enumerate(patterns)
+    ]
+    entries.sort(key=lambda entry: -entry["seconds"])
+    return {
+        "version": engine.version,
+        "texts": text_count,
+        "characters": characters,
+        "timeout": timeout,
+        "seconds": round(sum(seconds), 6),
+        "patterns": entries,
+    }
+
@@ -0,0 +1,355 @@
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from typing import NamedTuple
+
+from tag_engine import changed_tags, load_engine, profile_patterns, snapshot_dir, snapshot_patterns
+
+# --- Tag Dictionary ---
+# The dictionary maps tag categories to subcategories and lists of regex patterns (third party
+# regex module); a category can also be a flat list of patterns, tagged by category name alone.
+# It is read from JSON: the copy the Electron app maintains in its userData folder (passed in
+# MEMORY_FORGE_REGEX_DICTIONARY), or the default regex_dictionary.json next to this file.
+DEFAULT_DICTIONARY_PATH = Path(__file__).with_name("regex_dictionary.json")
+
+
+# Output: Path of the dictionary file to use
+def dictionary_path():
+    user_path = os.getenv("MEMORY_FORGE_REGEX_DICTIONARY")
+    if user_path and Path(user_path).is_file():
+        return Path(user_path)
+    return DEFAULT_DICTIONARY_PATH
+
+
+# --- Compiled tag engine ---
+# Built once at import time (from an on-disk snapshot when the dictionary is unchanged)
+# and reused by every suggest_tags call
+DICTIONARY_PATH = dictionary_path()
+TAG_ENGINE = load_engine(DICTIONARY_PATH)
+
+
+# Picks up dictionary edits in a long-running process (see worker.py)
+# Output: True if the dictionary changed and TAG_ENGINE was rebuilt
+def reload_engine():
+    global DICTIONARY_PATH, TAG_ENGINE
+    path = dictionary_path()
+    engine = load_engine(path)
+    changed = engine.version != TAG_ENGINE.version
+    DICTIONARY_PATH, TAG_ENGINE = path, engine
+    return changed
+
+# --- Tagging Logic ---
+# Seconds a single regex pattern may spend on one text before it is abandoned
+PATTERN_TIMEOUT = float(os.getenv("MEMORY_FORGE_PATTERN_TIMEOUT", "5"))
+
+# Seconds the regex patterns may spend on one whole document (unset: no budget). Whole-word
+# phrase tags are always counted; once the budget is spent the remaining regex patterns,
+# most expensive last, are skipped and their tags reported as partial
+TAG_BUDGET = float(os.environ["MEMORY_FORGE_TAG_BUDGET"]) if os.getenv("MEMORY_FORGE_TAG_BUDGET") else None
+
+# Texts of at least TAG_THREADS_MIN_CHARS characters (whole transcripts written with
+# MEMORY_FORGE_CHUNK_SIZE=0, or old whole-file records re-tagged by batch/retag) spread their
+# regex patterns over TAG_THREADS threads (0: one per core, 1: never). RAG chunks are far
+# shorter and are tagged serially, where a thread pool would cost more than it saves.
+TAG_THREADS = int(os.getenv("MEMORY_FORGE_TAG_THREADS", "0")) or os.cpu_count() or 1
+TAG_THREADS_MIN_CHARS = int(os.getenv("MEMORY_FORGE_TAG_THREADS_MIN_CHARS", "50000"))
+
+# Result of tagging one document
+#   tags: the top tags, scores: dict of tag -> score as returned by score_tags,
+#   partial: tags with at least one pattern skipped or cut short (timeout or budget),
+#            whose scores may be too low
+#   version: version of the dictionary the text was tagged with
+class TagResult(NamedTuple):
+    tags: list
+    scores: dict
+    partial: list
+    version: str
+
+
+# This function scores every tag of the dictionary against a text
+# Input: text (string) to analyze,
+#        threads (int or None) to spread the regex patterns over a thread pool, None picks
+#        TAG_THREADS for texts of TAG_THREADS_MIN_CHARS or more and 1 otherwise,
+#        tags (iterable of tags or None) to score only some subcategories,
+#        budget (float or None) seconds for the regex patterns of the whole text,
+#        skipped (list or None) collects the patterns that were skipped or cut short,
+#        engine (TagEngine or None) to score with, defaults to TAG_ENGINE
+# Output: dict of tag -> score for tags with a score > 0, in dictionary order
+def score_tags(text, threads=None, tags=None, budget=None, skipped=None, engine=None):
+    # reload_engine() can swap TAG_ENGINE from another thread; one call uses one engine
+    engine = engine or TAG_ENGINE
+    # Convert the text to lowercase; the patterns are all written in lowercase
+    text_lower = text.lower()
+    if threads is None:
+        threads = TAG_THREADS if len(text_lower) >= TAG_THREADS_MIN_CHARS else 1
+
+    # Calculate scores for each tag by counting keyword occurrences
+    skipped = skipped if skipped is not None else []
+    # The budget covers the proximity rules too
+    deadline = time.monotonic() + budget if budget is not None else None
+    scores = engine.count(text_lower, threads=threads, tags=tags, timeout=PATTERN_TIMEOUT, skipped=skipped, budget=budget)
+
+    # Context rules declared in the dictionary, e.g. military terms near a conflict zone
+    # add extra weight to the military and location tags
+    rule_points = engine.rule_scores(text_lower, tags=tags, timeout=PATTERN_TIMEOUT, skipped=skipped, deadline=deadline)
+    for tag, points in rule_points.items():
+        scores[tag] = scores.get(tag, 0) + points
+
+    if skipped:
+        print(
+            f"{len(skipped)} pattern(s) skipped or cut short by the time limits: "
+            + ", ".join(f"{pattern.tag}[{pattern.index}]" for pattern in skipped),
+            file=sys.stderr,
+        )
+
+    return {tag: scores[tag] for tag in engine.subcategories if scores.get(tag, 0) > 0}
+
+
+# Input: scores (dict) as returned by score_tags, top_n (int) number of tags to return
+# Output: list of the top N tags with scores > 0, sorted by score (highest first)
+def top_tags(scores, top_n=5):
+    return sorted([k for k, v in scores.items() if v > 0], key=lambda k: -scores[k])[:top_n]
+
+
+# This function analyzes text and suggests relevant tags based on keyword matching
+# Input: text (string) to analyze, top_n (int) number of tags to return,
+#        threads (int or None) as in score_tags
+# Output: list of the most relevant tags (strings)
+def suggest_tags(text, top_n=5, threads=None):
+    return top_tags(score_tags(text, threads=threads), top_n)
+
+
+# Tags one document within a time budget, degrading to a partial result instead of stalling
+# Input: text (string) to analyze, top_n (int) number of tags to return,
+#        budget (float or None) seconds for the regex patterns, defaults to TAG_BUDGET,
+#        threads (int or None) as in score_tags
+# Output: TagResult
+def tag_text(text, top_n=5, budget=None, threads=None):
+    # The version stamped on the result is the one of the engine that did the counting
+    engine = TAG_ENGINE
+    skipped = []
+    budget = budget if budget is not None else TAG_BUDGET
+    scores = score_tags(text, threads=threads, budget=budget, skipped=skipped, engine=engine)
+    partial = {pattern.tag for pattern in skipped}
+    return TagResult(
+        top_tags(scores, top_n),
+        scores,
+        [tag for tag in engine.subcategories if tag in partial],
+        engine.version,
+    )
+
+
+# --- Batch tagging ---
+# Tags many texts across a pool of worker processes
+# Every worker has its own compiled TAG_ENGINE (inherited from the parent when processes are
+# forked, compiled once on import otherwise). Texts are sent to workers `chunksize` at a time
+# to amortize IPC cost, and only a bounded window of texts is read ahead of the results.
+# Input: texts (iterable of strings), top_n (int) number of tags per text,
+#        workers (int) number of processes (default: one per core), chunksize (int)
+# Output: generator of tag lists, in the same order as texts
+def suggest_tags_batch(texts, top_n=5, workers=None, chunksize=32):
+    return _map_texts(partial(suggest_tags, top_n=top_n), texts, workers, chunksize)
+
+
+# Same as suggest_tags_batch, but yields score_tags dicts
+def score_tags_batch(texts, workers=None, chunksize=32):
+    return _map_texts(score_tags, texts, workers, chunksize)
+
+
+def _map_texts(tag, texts, workers, chunksize):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(tag, texts)
+        return
+
+    texts = iter(texts)
+    window = workers * chunksize * 4
+    # Long texts in every process at once would oversubscribe the cores; split them instead
+    threads = max(1, TAG_THREADS // workers)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        while True:
+            batch = list(itertools.islice(texts, window))
+            if not batch:
+                break
+            yield from pool.imap(tag, batch, chunksize)
+
+
+def _init_worker(threads):
+    global TAG_THREADS
+    TAG_THREADS = threads
+
+
+# Re-tags every RAG record of a JSONL file with the current dictionary
+# Records without "content" (e.g. SFT examples) are copied through unchanged. Re-tagging
+# runs without a time budget. The output is written next to its target and moved into
+# place at the end, so output_path may be the input itself.
+# Input: input_path, output_path (strings), workers (int or None)
+# Output: number of records written
+def tag_jsonl(input_path, output_path, workers=None):
+    target_path = Path(output_path)
+    tmp_path = target_path.with_name(target_path.name + ".tag.tmp")
+    with open(input_path, encoding="utf-8") as source, open(tmp_path, "w", encoding="utf-8") as target:
+        records = (json.loads(line) for line in source if line.strip())
+        records, pending = itertools.tee(records)
+        texts = (record.get("content", "") for record in records)
+
+        written = 0
+        for record, result in zip(pending, _map_texts(_tag_unbudgeted, texts, workers, 32)):
+            if "content" in record:
+                record["tags"] = result.tags
+                record["tag_counts"] = result.scores
+                record["tag_version"] = result.version
+                # A partial list from an earlier run no longer applies
+                record.pop("tags_partial", None)
+                if result.partial:
+                    record["tags_partial"] = result.partial
+            target.write(json.dumps(record, ensure_ascii=False) + "\n")
+            written += 1
+    os.replace(tmp_path, target_path)
+    return written
+
+
+def _tag_unbudgeted(text):
+    return tag_text(text, budget=math.inf)
+
+
+# --- Incremental re-tagging ---
+# RAG records written by process() carry the per-tag scores they were tagged with
+# ("tag_counts") and the dictionary version ("tag_version"). After a dictionary edit only the
+# subcategories that changed between the record's version and the current one are rescored;
+# the old version's pattern lists are recovered from the engine snapshot cache. Tags a record
+# lists in "tags_partial" (cut short by the tagging budget) are always rescored, without a budget.
+# Input: input_path (string), output_path (string or None to rewrite the input in place)
+# Output: dict with the number of records that were unchanged, partially or fully retagged
+def retag_jsonl(input_path, output_path=None):
+    cache_dirs = [snapshot_dir(DICTIONARY_PATH), snapshot_dir(DEFAULT_DICTIONARY_PATH)]
+    # The whole file is brought up to one engine, even if the dictionary is reloaded meanwhile
+    engine = TAG_ENGINE
+    # tag_version -> set of changed tags, or None when that version is unknown
+    changes = {}
+    stats = {"unchanged": 0, "partial": 0, "full": 0}
+
+    target_path = Path(output_path or input_path)
+    tmp_path = target_path.with_name(target_path.name + ".retag.tmp")
+    with open(input_path, encoding="utf-8") as source, open(tmp_path, "w", encoding="utf-8") as target:
+        for line in source:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "content" in record:
+                stats[_retag_record(record, changes, cache_dirs, engine)] += 1
+            target.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, target_path)
+    return stats
+
+
+# Brings one RAG record up to the version of engine (the current TagEngine)
+# Output: "unchanged", "partial" or "full"
+def _retag_record(record, changes, cache_dirs, engine):
+    version = record.get("tag_version")
+    counts = record.get("tag_counts")
+    partial = set(record.pop("tags_partial", ()))
+    if version == engine.version and counts is not None and not partial:
+        return "unchanged"
+
+    if version == engine.version:
+        changed = set()
+    else:
+        if version not in changes:
+            old_patterns = snapshot_patterns(version, cache_dirs) if version else None
+            changes[version] = None if old_patterns is None else changed_tags(old_patterns, engine)
+        changed = changes[version]
+    if changed is not None:
+        changed = changed | partial
+
+    if changed is None or counts is None:
+        scores = score_tags(record["content"], engine=engine)
+        result = "full"
+    else:
+        # Tags tied together by a proximity rule are rescored together
+        if changed & engine.rule_tags:
+            changed = changed | engine.rule_tags
+        merged = {tag: count for tag, count in counts.items() if tag not in changed}
+        merged.update(score_tags(record["content"], tags=changed & engine.subcategories.keys(), engine=engine))
+        scores = {tag: merged[tag] for tag in engine.subcategories if merged.get(tag, 0) > 0}
+        result = "partial"
+
+    record["tags"] = top_tags(scores)
+    record["tag_counts"] = scores
+    record["tag_version"] = engine.version
+    return result
+
+
+# --- Pattern profiling ---
+# Reads texts to profile from .txt files (whole file) and .jsonl outputs (each record's content)
+def read_texts(paths):
+    for path in paths:
+        path = Path(path)
+        if path.suffix == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        yield record.get("content") or record.get("response") or ""
+        else:
+            yield path.read_text(encoding="utf-8")
+
+
+# Profiles every pattern of the current dictionary over a corpus and writes the report as JSON
+# (shown by the RegexBuilder UI)
+# Input: report_path (string), paths (list of .txt/.jsonl paths)
+# Output: the report dict (see tag_engine.profile_patterns)
+def profile_dictionary(report_path, paths):
+    report = profile_patterns(TAG_ENGINE, read_texts(paths), timeout=PATTERN_TIMEOUT)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+# --- CLI usage ---
+# python tagging.py report
+#   Lists which patterns take the whole-word fast path and which run through regex
+# python tagging.py batch <input.jsonl> <output.jsonl> [workers]
+#   Re-tags every record of an existing output file across a process pool
+# python tagging.py retag <input.jsonl> [output.jsonl]
+#   Brings existing output up to the current dictionary, rescoring only changed subcategories
+# python tagging.py profile <report.json> <path> [<path> ...]
+#   Times every pattern over .txt/.jsonl files and ranks the most expensive ones
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "profile":
+        report = profile_dictionary(sys.argv[2], sys.argv[3:])
+        print(f"Profiled {len(report['patterns'])} pattern(s) over {report['texts']} text(s) in {report['seconds']:.2f}s")
+        for entry in report["patterns"][:10]:
+            print(f"{entry['seconds']:9.4f}s  {entry['timeouts']} timeout(s)  {entry['tag']}[{entry['index']}]  {entry['source'][:80]}")
+        sys.exit(0)
+
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "retag":
+        stats = retag_jsonl(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"{stats['unchanged']} unchanged, {stats['partial']} partially and {stats['full']} fully retagged")
+        sys.exit(0)
+
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "batch":
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        written = tag_jsonl(sys.argv[2], sys.argv[3], workers)
+        print(f"Tagged {written} record(s) into {sys.argv[3]}")
+        sys.exit(0)
+
+    if len(sys.argv) == 2 and sys.argv[1] == "report":
+        report = TAG_ENGINE.fast_path_report()
+        for entry in report["patterns"]:
+            path = "fast " if entry["fast_path"] else "regex"
+            print(f"{path}  {entry['tag']}[{entry['index']}]  {entry['source']}")
+        print(f"{report['fast_path']} pattern(s) on the fast path, {report['regex']} through regex")
+        sys.exit(0)
+
+    print("Usage: python tagging.py report")
+    print("       python tagging.py batch <input.jsonl> <output.jsonl> [workers]")
+    print("       python tagging.py retag <input.jsonl> [output.jsonl]")
+    print("       python tagging.py profile <report.json> <path> [<path> ...]")
+    sys.exit(1)
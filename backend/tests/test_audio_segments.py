@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from audio_segments import split_on_silence
+
+RATE = 16000
+
+
+def tone(seconds):
+    # Steady speech-level signal: no pauses anywhere
+    t = np.arange(int(seconds * RATE), dtype=np.float32) / RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def assert_covers(segments, total):
+    assert segments[0][0] == 0 and segments[-1][1] == total
+    assert all(end > start for start, end in segments)
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+
+
+@pytest.mark.parametrize("seconds", [95, 119.5, 250, 301.3])
+def test_pause_free_recording(seconds):
+    samples = tone(seconds)
+    segments = split_on_silence(samples, RATE, segment_seconds=60)
+    assert_covers(segments, len(samples))
+    assert all(end - start <= 120 * RATE for start, end in segments)
+
+
+def test_cuts_land_in_pauses():
+    pause = np.zeros(RATE, dtype=np.float32)
+    samples = np.concatenate([tone(55), pause, tone(70), pause, tone(40)])
+    segments = split_on_silence(samples, RATE, segment_seconds=60)
+    assert_covers(segments, len(samples))
+    assert [round(start / RATE, 1) for start, _end in segments[1:]] == [55.5, 126.5]
+
+
+def test_short_recording_is_one_segment():
+    samples = tone(80)
+    assert split_on_silence(samples, RATE, segment_seconds=60) == [(0, len(samples))]
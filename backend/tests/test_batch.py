@@ -0,0 +1,134 @@
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from batch import _commit, _write_manifest, job_key, load_manifest, manifest_path  # noqa: E402
+from output_sinks import open_sink  # noqa: E402
+
+
+def write_lines(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def entry(name):
+    return {"hash": name * 8, "path": f"{name}.txt", "records": 1, "seconds": 0.0, "audio_seconds": 0.0}
+
+
+# Commits one block like run_batch does; crash_after stops after the block is written
+# ("block") or before it reaches the output ("pending"), as an interrupted run would
+def commit(output, records, entries, crash_after=None):
+    with open_sink(output, hold=True) as writer, open(manifest_path(output), "a", encoding="utf-8") as manifest:
+        writer.write_many(records)
+        if crash_after is None:
+            _commit(writer, manifest, list(entries))
+            return
+        blocks = []
+
+        def pending(block):
+            blocks.append(block)
+            _write_manifest(manifest, [{"pending": entries, **block}])
+
+        writer.flush(pending)
+    if crash_after == "pending":
+        with open(output, "r+b") as f:
+            f.truncate(blocks[0]["output_start"])
+
+
+@pytest.fixture
+def output(tmp_path):
+    return str(tmp_path / "out.jsonl")
+
+
+def test_existing_output_without_manifest_is_kept(output):
+    write_lines(output, [{"content": "a"}, {"content": "b"}])
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "a"}, {"content": "b"}]
+
+
+def test_committed_files_are_done(output):
+    commit(output, [{"content": "a"}], [entry("a")])
+    done = load_manifest(output)
+    assert list(done) == ["aaaaaaaa"]
+    assert read_lines(output) == [{"content": "a"}]
+
+
+def test_records_appended_after_the_batch_are_kept(output):
+    commit(output, [{"content": "a"}], [entry("a")])
+    write_lines(output, [{"content": "app"}])
+    assert list(load_manifest(output)) == ["aaaaaaaa"]
+    assert read_lines(output) == [{"content": "a"}, {"content": "app"}]
+
+
+def test_complete_block_without_entries_is_kept(output):
+    write_lines(output, [{"content": "before"}])
+    commit(output, [{"content": "b"}], [entry("b")], crash_after="block")
+    write_lines(output, [{"content": "app"}])
+    assert list(load_manifest(output)) == ["bbbbbbbb"]
+    assert read_lines(output) == [{"content": "before"}, {"content": "b"}, {"content": "app"}]
+    # Settled once: the next resume finds the same
+    assert list(load_manifest(output)) == ["bbbbbbbb"]
+
+
+def test_block_that_never_got_out_is_abandoned(output):
+    write_lines(output, [{"content": "before"}])
+    commit(output, [{"content": "b"}], [entry("b")], crash_after="pending")
+    write_lines(output, [{"content": "app"}, {"content": "app 2"}])
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "before"}, {"content": "app"}, {"content": "app 2"}]
+
+
+def test_torn_block_is_moved_aside(output):
+    write_lines(output, [{"content": "before"}])
+    commit(output, [{"content": "b" * 1000}], [entry("b")], crash_after="block")
+    size = os.path.getsize(output)
+    with open(output, "r+b") as f:
+        f.truncate(size - 500)
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "before"}]
+    with open(output + ".unfinished", encoding="utf-8") as f:
+        assert f.read().startswith('{"content": "bbb')
+    # Settled once: records appended later are not touched by the next resume
+    write_lines(output, [{"content": "app"}])
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "before"}, {"content": "app"}]
+
+
+def test_output_appended_where_the_block_never_got_out_is_left_alone(output):
+    write_lines(output, [{"content": "before"}])
+    commit(output, [{"content": "b" * 1000}], [entry("b")], crash_after="pending")
+    # Shorter than the block, so it ends where a torn block would
+    write_lines(output, [{"content": "app"}])
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "before"}, {"content": "app"}]
+    assert not os.path.exists(output + ".unfinished")
+
+
+def test_block_that_does_not_match_is_left_alone(output):
+    commit(output, [{"content": "b"}], [entry("b")], crash_after="block")
+    with open(output, "r+b") as f:
+        f.write(b'{"content": "x"}')
+    assert load_manifest(output) == {}
+    assert read_lines(output) == [{"content": "x"}]
+
+
+def test_files_are_done_per_mode(output):
+    rag = job_key("a" * 8, "rag", "a", "")
+    commit(output, [{"content": "a"}], [{**entry("a"), "key": rag}])
+    done = load_manifest(output)
+    assert list(done) == [rag]
+    assert job_key("a" * 8, "rag", "a", "Summarize") in done
+    # Another title goes into the records; SFT records depend on the instruction instead
+    assert job_key("a" * 8, "rag", "copy of a", "") not in done
+    assert job_key("a" * 8, "sft", "a", "") not in done
+    assert job_key("a" * 8, "sft", "copy of a", "Summarize") != job_key("a" * 8, "sft", "a", "Answer")
+    assert job_key("a" * 8, "sft", "copy of a", "Summarize") == job_key("a" * 8, "sft", "a", "Summarize")
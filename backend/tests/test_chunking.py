@@ -0,0 +1,30 @@
+import time
+
+from chunking import chunk_text, iter_sentences
+
+
+def test_sentences_tile_the_text():
+    text = "Dr. Smith met Mr. Jones approx. at noon. Then I left! Did you? OK.  "
+    sentences = list(iter_sentences([text[:20], text[20:50], text[50:]]))
+    assert [sentence for sentence, _start in sentences] == [
+        "Dr. Smith met Mr. Jones approx. at noon. ",
+        "Then I left! ",
+        "Did you? ",
+        "OK.  ",
+    ]
+    assert all(text[start:start + len(sentence)] == sentence for sentence, start in sentences)
+
+
+def test_many_sentence_ends_take_linear_time():
+    text = "Hello x. " * 20000
+    started = time.monotonic()
+    assert "".join(sentence for sentence, _start in iter_sentences([text])) == text
+    assert time.monotonic() - started < 2
+
+
+def test_chunks_respect_the_size():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    chunks = list(chunk_text([text], len, size=200, overlap=40))
+    assert all(len(chunk.text) <= 200 for chunk in chunks)
+    assert all(text[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+    assert chunks[-1].end == len(text)
@@ -0,0 +1,47 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pipeline import Failed, Stage, run_pipeline
+
+
+def double(value):
+    return value * 2
+
+
+def exit_on_three(value):
+    if value == 3:
+        # A worker killed from outside, e.g. by the OOM killer
+        os._exit(1)
+    return value
+
+
+# Runs the pipeline on a thread, so a hang fails the test instead of the whole run
+def run(jobs, stages, timeout=60):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(run_pipeline(jobs, stages)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_pipeline did not finish"
+    return dict(results)
+
+
+def test_jobs_go_through_every_stage():
+    with ThreadPoolExecutor(2) as first, ThreadPoolExecutor(2) as second:
+        stages = [Stage("first", double, first, 2), Stage("second", double, second, 2)]
+        results = run(((i, i) for i in range(20)), stages)
+    assert results == {i: i * 4 for i in range(20)}
+
+
+def test_broken_process_pool_fails_the_remaining_jobs():
+    with ProcessPoolExecutor(1) as pool, ThreadPoolExecutor(1) as threads:
+        stages = [Stage("work", exit_on_three, pool, 2), Stage("after", double, threads, 2)]
+        results = run(((i, i) for i in range(10)), stages)
+
+    assert sorted(results) == list(range(10))
+    assert isinstance(results[3], Failed) and results[3].stage == "work"
+    failed = [key for key, value in results.items() if isinstance(value, Failed)]
+    assert all(isinstance(results[key].error, BrokenProcessPool) for key in failed)
+    # Jobs after the crash cannot have run on the broken pool
+    assert failed == list(range(failed[0], 10))
@@ -0,0 +1,149 @@
+import json
+from pathlib import Path
+
+import pytest
+import regex as re
+
+import tagging
+from tag_engine import PhraseMatcher
+from tagging import DEFAULT_DICTIONARY_PATH, TAG_ENGINE, load_engine, score_tags, suggest_tags, tag_jsonl
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "tagging").glob("*.txt"))
+
+
+# --- Reference ---
+# suggest_tags as it was before the tag engine: one re.findall per raw pattern string, then
+# the military scan around the first mention of each location. Flat categories such as
+# routines_plans are tagged by category name (they used to crash the scan).
+def original_scores(text, dictionary):
+    text_lower = text.lower()
+    scores = {}
+    for category, subcategories in dictionary.items():
+        if category.startswith("_"):
+            continue
+        if not isinstance(subcategories, dict):
+            subcategories = {None: subcategories}
+        for subcategory, patterns in subcategories.items():
+            match_count = 0
+            for pattern in patterns:
+                match_count += len(re.findall(pattern, text_lower))
+            if match_count > 0:
+                scores[category if subcategory is None else f"{category}.{subcategory}"] = match_count
+
+    military_patterns = dictionary["activities_experiences"]["military"]
+    military_locations = ["somalia", "south sudan", "afghanistan", "iraq", "palestine", "syria", "ukraine"]
+    for location in military_locations:
+        if location in text_lower:
+            loc_index = text_lower.find(location)
+            context_window = text_lower[max(0, loc_index - 150):min(len(text_lower), loc_index + 150)]
+            if any(re.search(pattern, context_window) for pattern in military_patterns):
+                scores["activities_experiences.military"] = scores.get("activities_experiences.military", 0) + 2
+                scores["societal_context.location"] = scores.get("societal_context.location", 0) + 1
+    return scores
+
+
+@pytest.fixture(scope="module")
+def dictionary():
+    with open(DEFAULT_DICTIONARY_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def engine(dictionary):
+    if TAG_ENGINE.version == load_engine(DEFAULT_DICTIONARY_PATH).version:
+        return TAG_ENGINE
+    pytest.skip("MEMORY_FORGE_REGEX_DICTIONARY points at a different dictionary")
+
+
+# --- Parity ---
+def test_fixtures_exist():
+    assert len(FIXTURES) >= 3
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_scores_match_original(path, dictionary, engine):
+    text = path.read_text(encoding="utf-8")
+    expected = original_scores(text, dictionary)
+    assert expected, "fixture should hit some tags"
+    assert score_tags(text) == expected
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_suggest_tags_match_original(path, dictionary, engine):
+    text = path.read_text(encoding="utf-8")
+    expected = original_scores(text, dictionary)
+    tags = suggest_tags(text)
+    # Tags tied on score may come in another order
+    assert [expected.get(tag) for tag in tags] == sorted(expected.values(), reverse=True)[:5]
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_count_matches_findall(path, engine):
+    text_lower = path.read_text(encoding="utf-8").lower()
+    assert engine.count(text_lower) == engine.count_findall(text_lower)
+
+
+# The single-pass path: every whole-word phrase pattern counted in one scan of the tokens
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_phrase_matcher_matches_findall(path, engine):
+    text_lower = path.read_text(encoding="utf-8").lower()
+    matcher = PhraseMatcher(engine.fast_path)
+    expected = [len(pattern.regex.findall(text_lower)) for pattern in engine.fast_path]
+    assert sum(expected), "fixture should hit some phrase patterns"
+    assert matcher.count(text_lower) == expected
+
+
+def test_most_patterns_take_the_phrase_path(engine):
+    report = engine.fast_path_report()
+    assert report["fast_path"] > 0.9 * (report["fast_path"] + report["regex"])
+
+
+def test_empty_text(engine):
+    assert score_tags("") == {}
+    assert suggest_tags("") == []
+
+
+def test_tag_jsonl_in_place(tmp_path, engine):
+    path = tmp_path / "out.jsonl"
+    records = [
+        {"title": "a", "content": "I enlisted in the army.", "tags": [], "tags_partial": ["family.parents"]},
+        {"instruction": "i", "response": "r"},
+    ]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+    assert tag_jsonl(path, path, workers=1) == 2
+    tagged, example = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert tagged["tag_counts"] == score_tags(records[0]["content"])
+    assert tagged["tag_version"] == engine.version
+    assert "tags_partial" not in tagged
+    assert example == records[1]
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_parallel_scores_match_serial(path, engine):
+    text = path.read_text(encoding="utf-8")
+    assert score_tags(text, threads=4) == score_tags(text, threads=1)
+    assert engine.count(text.lower(), threads=4) == engine.count_findall(text.lower())
+
+
+def test_long_texts_are_tagged_in_parallel(monkeypatch, engine):
+    # A whole transcript, as written with MEMORY_FORGE_CHUNK_SIZE=0
+    text = "\n\n".join(path.read_text(encoding="utf-8") for path in FIXTURES) * 20
+    calls = []
+    count = engine.count
+    monkeypatch.setattr(tagging, "TAG_THREADS", 4)
+    monkeypatch.setattr(tagging, "TAG_THREADS_MIN_CHARS", 10000)
+    monkeypatch.setattr(engine, "count", lambda *args, **kwargs: calls.append(kwargs["threads"]) or count(*args, **kwargs))
+    parallel = score_tags(text)
+    short = score_tags(text[:1000])
+    assert calls == [4, 1]
+    assert parallel == score_tags(text, threads=1)
+    assert short == score_tags(text[:1000], threads=1)
+
+
+def test_spent_budget_skips_the_proximity_rules(engine):
+    text = (Path(__file__).parent / "fixtures" / "tagging" / "veteran_interview.txt").read_text(encoding="utf-8")
+    assert engine.rule_scores(text.lower()), "fixture should trigger a proximity rule"
+    result = tagging.tag_text(text, budget=0)
+    assert {"activities_experiences.military", "societal_context.location"} <= set(result.partial)
+    phrase_only = engine.count(text.lower(), budget=0)
+    assert result.scores == {tag: phrase_only[tag] for tag in engine.subcategories if tag in phrase_only}
@@ -1,50 +1,159 @@
 import sys
 import os
-import tempfile
-import whisper
-from process import process
+import queue
+import threading
+from output_sinks import pop_format_flag
+from process import process_stream
+from audio_cache import AUDIO_CACHE
+from audio_segments import PARALLEL_MIN_SECONDS, transcribe_parallel
+from transcription_backends import BACKENDS, SAMPLE_RATE, benchmark, get_backend, load_audio
+from whisper_models import DEFAULT_MODEL, MODELS
 
 # This script transcribes an MP3 audio file to text and processes it according to specified parameters.
-# It requires 5 command-line arguments to run properly.
-
-# Check if the correct number of command-line arguments is provided
-if len(sys.argv) < 6:
-    print("Usage: python transcribe.py <mp3_path> <title> <instruction> <mode> <output_path>")
-    sys.exit(1)
-
-# Extract command-line arguments
-# mp3_path: Path to the MP3 file to transcribe
-mp3_path = sys.argv[1]
-# title: Title for the transcribed content
-title = sys.argv[2]
-# instruction: Instructions for processing the transcription
-instruction = sys.argv[3]
-# mode: Processing mode (RAG or SFT)
-mode = sys.argv[4]
-# output_path: Where to save the final processed output
-output_path = sys.argv[5]
-
-# Initialize the Whisper speech recognition model
-# The "small" model balances accuracy and resource usage
-print("Transcribing with Whisper...")
-model = whisper.load_model("small")
-
-# Perform the actual transcription of the audio file
-# This converts the speech in the MP3 to text
-result = model.transcribe(mp3_path)
-
-# Save the transcribed text to a temporary file
-# This creates a text file that will be used for further processing
-with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, mode="w", encoding="utf-8") as tmp:
-    tmp.write(result["text"])
-    txt_path = tmp.name
-
-# Process the transcription according to the specified mode
-# This converts the raw transcription into a structured JSONL format
-# The format depends on whether it's for RAG (Retrieval Augmented Generation)
-# or SFT (Supervised Fine-Tuning)
-final_output = process(txt_path, title, instruction, mode, output_path)
-
-# Indicate completion and show the result
-print("Done!")
-print(final_output)
\ No newline at end of file
+# It requires 5 command-line arguments to run properly (a 6th and 7th pick the Whisper model size and backend).
+
+# Processes used to transcribe long recordings in parallel (1: always one decode loop)
+TRANSCRIBE_WORKERS = int(os.getenv("MEMORY_FORGE_TRANSCRIBE_WORKERS", "1"))
+
+# Segments transcription may run ahead of processing
+PREFETCH_SEGMENTS = 256
+
+# --- Transcription ---
+# This function transcribes an audio file and processes the transcript into the output file
+# Transcription runs on a background thread and hands its segments straight to
+# process_stream(), so the first chunks are punctuated, tagged and written while later
+# audio is still being transcribed; nothing goes through a temporary file.
+# Inputs:
+#   mp3_path: Path to the MP3 file to transcribe
+#   title: Title for the transcribed content
+#   instruction: Instructions for processing the transcription
+#   mode: Processing mode (RAG or SFT)
+#   output_path: Where to save the final processed output
+#   model: Whisper model size (tiny, base, small, medium); None uses the default ("small"
+#          balances accuracy and resource usage)
+#   backend: transcription backend (whisper, whisper-int8, faster-whisper); None uses the default
+#   workers: processes for recordings longer than PARALLEL_MIN_SECONDS, which are split at
+#            pauses and transcribed in parallel; None uses MEMORY_FORGE_TRANSCRIBE_WORKERS
+#   output_format: jsonl, jsonl.gz, jsonl.zst, parquet or arrow; None picks it from
+#                  MEMORY_FORGE_OUTPUT_FORMAT or the output path's extension
+# Output: the formatted text, as returned by process_stream()
+def transcribe(mp3_path, title, instruction, mode, output_path, model=None, backend=None, workers=None, output_format=None):
+    print("Transcribing with Whisper...")
+    segments = _prefetch(transcribe_segments(mp3_path, model, backend, workers))
+    return process_stream(segments, title, instruction, mode, output_path, output_format)
+
+
+# Transcribes one recording, in parallel pieces when it is long and workers > 1
+# A recording already transcribed with the same model and backend comes from the audio
+# cache; a complete new transcript is added to it.
+# Output: iterator of segment dicts ({"start", "end", "text"}) in order
+def transcribe_segments(mp3_path, model=None, backend=None, workers=None):
+    model = model or DEFAULT_MODEL
+    backend = get_backend(backend).name
+    audio_hash = AUDIO_CACHE.audio_hash(mp3_path)
+    cached = AUDIO_CACHE.transcript(audio_hash, backend, model)
+    if cached is not None:
+        print("Using cached transcript")
+        yield from cached
+        return
+
+    segments = []
+    for segment in _transcribe_uncached(mp3_path, audio_hash, model, backend, workers):
+        segments.append(segment)
+        yield segment
+    AUDIO_CACHE.store_transcript(audio_hash, backend, model, segments)
+
+
+def _transcribe_uncached(mp3_path, audio_hash, model, backend, workers):
+    workers = workers or TRANSCRIBE_WORKERS
+    # Decode once; every path can transcribe from the samples
+    audio = AUDIO_CACHE.decoded_audio(audio_hash, mp3_path, load_audio)
+    if workers > 1 and len(audio) / SAMPLE_RATE >= PARALLEL_MIN_SECONDS:
+        yield from transcribe_parallel(audio, model, backend, workers)["segments"]
+        return
+
+    # The model stays loaded in this process for the following transcriptions
+    with MODELS.use(model, backend) as whisper_model:
+        # Perform the actual transcription of the audio file
+        # This converts the speech in the MP3 to text
+        yield from get_backend(backend).transcribe_segments(whisper_model, audio)
+
+
+# Runs a generator on a background thread, up to `size` items ahead of the consumer
+# Errors are re-raised in the consumer; a consumer that stops early stops the producer too.
+def _prefetch(iterable, size=PREFETCH_SEGMENTS):
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    break
+            else:
+                put((False, None))
+        except Exception as e:
+            put((False, e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=produce, name="transcription", daemon=True).start()
+    try:
+        while True:
+            ok, value = items.get()
+            if ok:
+                yield value
+            elif value is None:
+                return
+            else:
+                raise value
+    finally:
+        stop.set()
+
+
+# --- CLI usage ---
+if __name__ == "__main__":
+    # Compare the real-time factor of the transcription backends on one recording
+    if len(sys.argv) >= 3 and sys.argv[1] == "benchmark":
+        size = sys.argv[3] if len(sys.argv) > 3 else "small"
+        for entry in benchmark(sys.argv[2], sys.argv[4:] or list(BACKENDS), size):
+            if "error" in entry:
+                print(f"{entry['backend']:15} {entry['size']:7} failed: {entry['error']}")
+            else:
+                print(
+                    f"{entry['backend']:15} {entry['size']:7} RTF {entry['rtf']:.3f}  "
+                    f"{entry['seconds']:8.2f}s for {entry['audio_seconds']:.0f}s of audio  (load {entry['load_seconds']:.2f}s)"
+                )
+        sys.exit(0)
+
+    # --format <name> picks the output format (see output_sinks.py)
+    argv, output_format = pop_format_flag(sys.argv)
+
+    # Check if the correct number of command-line arguments is provided
+    if len(argv) < 6:
+        print("Usage: python transcribe.py <mp3_path> <title> <instruction> <mode> <output_path> [tiny|base|small|medium] [backend] [--format name]")
+        print("       python transcribe.py benchmark <audio_path> [size] [backend ...]")
+        print(f"Backends: {', '.join(BACKENDS)}")
+        sys.exit(1)
+
+    # Extract command-line arguments
+    mp3_path, title, instruction, mode, output_path = argv[1:6]
+    model = argv[6] if len(argv) > 6 else None
+    backend = argv[7] if len(argv) > 7 else None
+
+    final_output = transcribe(mp3_path, title, instruction, mode, output_path, model, backend, output_format=output_format)
+
+    # Indicate completion and show the result
+    print("Done!")
+    print(final_output)
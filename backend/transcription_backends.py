@@ -0,0 +1,208 @@
+import os
+import time
+
+# --- Transcription backends ---
+# Interchangeable speech-to-text engines behind one interface, so CPU-only machines can
+# trade the stock fp32 Whisper for a quantized one. Every backend loads a model for a size
+# (tiny, base, small, medium) and transcribes an audio file into
+#   {"text": str, "segments": [{"start": float, "end": float, "text": str}, ...], "language": str}
+# or streams the segments one by one as they are decoded (transcribe_segments).
+# All heavy imports (torch, whisper, faster_whisper) happen on first load.
+#
+#   whisper          openai-whisper as shipped: fp32 on CPU
+#   whisper-int8     openai-whisper with torch dynamic int8 quantization of every Linear layer
+#   faster-whisper   CTranslate2 int8 engine (pip install faster-whisper)
+
+# Backend used when a job does not ask for one
+DEFAULT_BACKEND = os.getenv("MEMORY_FORGE_TRANSCRIBE_BACKEND", "whisper")
+
+# Threads used inside one operator (matrix multiply etc.) and across independent operators;
+# 0 leaves the library default. On an 8-core box intra-op = 8, inter-op = 1 is a good start.
+INTRA_OP_THREADS = int(os.getenv("MEMORY_FORGE_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("MEMORY_FORGE_INTER_OP_THREADS", "0"))
+
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Characters of the previous piece's text used to prompt the next one when streaming
+PROMPT_CHARACTERS = 200
+
+
+class TranscriptionBackend:
+    name = None
+
+    # Input: size (string) Whisper model size
+    # Output: a model object for transcribe()
+    def load(self, size):
+        raise NotImplementedError
+
+    # Input: model from load(), audio (path string, or 16 kHz float32 samples),
+    #        prompt (string or None) text preceding the audio, to carry context across pieces
+    # Output: result dict as described above
+    def transcribe(self, model, audio, prompt=None):
+        raise NotImplementedError
+
+    # Yields segments while the rest of the audio is still being transcribed
+    # The default cuts the audio at pauses (audio_segments.split_on_silence) and transcribes
+    # the pieces in order, prompting each with the end of the text before it.
+    # Input: model from load(), audio (path string, or 16 kHz float32 samples)
+    # Output: iterator of segment dicts with timestamps relative to the start of the audio
+    def transcribe_segments(self, model, audio):
+        from audio_segments import split_on_silence
+
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        prompt = None
+        for start, end in split_on_silence(audio):
+            result = self.transcribe(model, audio[start:end], prompt)
+            offset = start / SAMPLE_RATE
+            for segment in result["segments"]:
+                segment["start"] += offset
+                segment["end"] += offset
+                yield segment
+            prompt = result["text"][-PROMPT_CHARACTERS:] or prompt
+
+
+class WhisperBackend(TranscriptionBackend):
+    name = "whisper"
+
+    def load(self, size):
+        import whisper
+        _configure_torch_threads()
+        return whisper.load_model(size, device="cpu")
+
+    def transcribe(self, model, audio, prompt=None):
+        # fp16 is not supported on CPU; asking for it only produces a warning
+        result = model.transcribe(audio, fp16=False, initial_prompt=prompt)
+        return {
+            "text": result["text"],
+            "segments": [
+                {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+                for segment in result["segments"]
+            ],
+            "language": result.get("language"),
+        }
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    name = "whisper-int8"
+
+    def load(self, size):
+        import torch
+
+        model = super().load(size)
+        # Whisper subclasses nn.Linear only to cast weights for fp16; in fp32 on CPU the plain
+        # class is equivalent, and dynamic quantization only recognises the plain class
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear):
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    name = "faster-whisper"
+
+    def load(self, size):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("The faster-whisper backend needs the faster-whisper package (pip install faster-whisper)") from None
+        return WhisperModel(
+            size,
+            device="cpu",
+            compute_type="int8",
+            cpu_threads=INTRA_OP_THREADS,
+            num_workers=max(1, INTER_OP_THREADS),
+        )
+
+    def transcribe(self, model, audio, prompt=None):
+        segments, info = model.transcribe(audio, initial_prompt=prompt)
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": info.language,
+        }
+
+    # CTranslate2 already decodes lazily: segments come out as the model reaches them
+    def transcribe_segments(self, model, audio):
+        segments, _info = model.transcribe(audio)
+        for segment in segments:
+            yield {"start": segment.start, "end": segment.end, "text": segment.text}
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend(), QuantizedWhisperBackend(), FasterWhisperBackend())}
+
+
+# Input: name (string or None for DEFAULT_BACKEND)
+# Output: TranscriptionBackend; raises ValueError for an unknown name
+def get_backend(name=None):
+    name = name or DEFAULT_BACKEND
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown transcription backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+# Applies INTRA_OP_THREADS / INTER_OP_THREADS to torch, once per process
+# torch only accepts the inter-op setting before it has run any parallel work
+_threads_configured = False
+
+
+def _configure_torch_threads():
+    global _threads_configured
+    if _threads_configured:
+        return
+    import torch
+
+    if INTRA_OP_THREADS:
+        torch.set_num_threads(INTRA_OP_THREADS)
+    if INTER_OP_THREADS:
+        try:
+            torch.set_num_interop_threads(INTER_OP_THREADS)
+        except RuntimeError:
+            pass
+    _threads_configured = True
+
+
+# Decodes an audio file to 16 kHz mono float32 samples (needs ffmpeg, like Whisper itself)
+def load_audio(path):
+    try:
+        from whisper.audio import load_audio as whisper_load_audio
+    except ImportError:
+        from faster_whisper import decode_audio
+        return decode_audio(path, sampling_rate=SAMPLE_RATE)
+    return whisper_load_audio(path, SAMPLE_RATE)
+
+
+# --- Benchmark ---
+# Transcribes the same audio with several backends and reports the real-time factor
+# (transcription seconds / audio seconds; below 1 is faster than real time)
+# Input: audio_path (string), backends (iterable of backend names), size (string) model size
+# Output: list of dicts (backend, size, load_seconds, seconds, audio_seconds, rtf, characters),
+#         fastest first; a backend that cannot load reports its error instead
+def benchmark(audio_path, backends, size="small"):
+    audio = load_audio(audio_path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    results = []
+    for name in backends:
+        backend = get_backend(name)
+        entry = {"backend": name, "size": size, "audio_seconds": round(audio_seconds, 2)}
+        try:
+            start = time.perf_counter()
+            model = backend.load(size)
+            entry["load_seconds"] = round(time.perf_counter() - start, 2)
+
+            start = time.perf_counter()
+            result = backend.transcribe(model, audio)
+            seconds = time.perf_counter() - start
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            results.append(entry)
+            continue
+        entry["seconds"] = round(seconds, 2)
+        entry["rtf"] = round(seconds / audio_seconds, 3) if audio_seconds else None
+        entry["characters"] = len(result["text"])
+        results.append(entry)
+        del model
+    return sorted(results, key=lambda entry: entry.get("rtf") or float("inf"))
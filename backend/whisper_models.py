@@ -0,0 +1,150 @@
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from transcription_backends import get_backend
+
+# --- Whisper model manager ---
+# Loading a Whisper model reads hundreds of megabytes of weights and initialises torch, which
+# for short voice notes takes longer than the transcription itself. The manager loads each
+# requested (backend, size) once and keeps it in memory for the following jobs. Models are evicted
+# least-recently-used when more than MAX_MODELS are loaded, and after IDLE_TIMEOUT seconds
+# without use so an idle worker gives the memory back.
+
+# Model sizes callers may ask for
+MODEL_SIZES = ("tiny", "base", "small", "medium")
+
+# Size used when a job does not ask for one
+DEFAULT_MODEL = os.getenv("MEMORY_FORGE_WHISPER_MODEL", "small")
+
+# How many models may stay loaded at once
+MAX_MODELS = int(os.getenv("MEMORY_FORGE_WHISPER_MAX_MODELS", "2"))
+
+# Seconds a model may sit unused before it is unloaded (0: never)
+IDLE_TIMEOUT = float(os.getenv("MEMORY_FORGE_WHISPER_IDLE_TIMEOUT", "600"))
+
+
+# Loads a model through its transcription backend; whisper (and torch) are only imported
+# when a model is first needed
+def load_model(backend, size):
+    return get_backend(backend).load(size)
+
+
+class ModelManager:
+    # Input: loader (callable (backend, size) -> model), max_models (int),
+    #        idle_timeout (float seconds, 0 for never)
+    def __init__(self, loader=load_model, max_models=MAX_MODELS, idle_timeout=IDLE_TIMEOUT):
+        self.loader = loader
+        self.max_models = max(1, max_models)
+        self.idle_timeout = idle_timeout
+        # (backend, size) -> model, least recently used first
+        self._models = {}
+        self._last_used = {}
+        # (backend, size) -> number of jobs currently holding the model (never evicted while > 0)
+        self._in_use = {}
+        # (backend, size) -> lock serialising jobs on that model (Whisper decoding is not thread-safe)
+        self._model_locks = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    # Borrows a model for one job, loading it on first use
+    # Jobs on the same model run one after another; different models can run side by side.
+    # Input: size (string) one of MODEL_SIZES, or None for DEFAULT_MODEL,
+    #        backend (string) a transcription_backends name, or None for DEFAULT_BACKEND
+    # Output: context manager yielding the model
+    @contextmanager
+    def use(self, size=None, backend=None):
+        size = size or DEFAULT_MODEL
+        if size not in MODEL_SIZES:
+            raise ValueError(f"Unknown Whisper model {size!r}, expected one of {', '.join(MODEL_SIZES)}")
+        key = (get_backend(backend).name, size)
+
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            model_lock = self._model_locks.setdefault(key, threading.Lock())
+        try:
+            with model_lock:
+                model = self._models.get(key)
+                if model is None:
+                    print(f"Loading Whisper model {key[1]} ({key[0]})...", file=sys.stderr)
+                    model = self.loader(*key)
+                    with self._lock:
+                        self._models[key] = model
+                        self._evict_over_limit()
+                with self._lock:
+                    # Move to the most recently used end
+                    self._models[key] = self._models.pop(key)
+                    self._last_used[key] = time.monotonic()
+                yield model
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                self._last_used[key] = time.monotonic()
+            self._start_sweeper()
+
+    # (backend, size) pairs currently loaded, least recently used first
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    # Unloads models that were not used for idle_timeout seconds
+    # Output: list of the (backend, size) pairs unloaded
+    def evict_idle(self):
+        if not self.idle_timeout:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                key for key in self._models
+                if not self._in_use.get(key) and now - self._last_used.get(key, now) >= self.idle_timeout
+            ]
+            for key in idle:
+                del self._models[key]
+        if idle:
+            _release_memory()
+        return idle
+
+    # Unloads every model that is not in use
+    def clear(self):
+        with self._lock:
+            for key in [key for key in self._models if not self._in_use.get(key)]:
+                del self._models[key]
+        _release_memory()
+
+    # Drops least recently used models beyond max_models; called with self._lock held
+    def _evict_over_limit(self):
+        for key in list(self._models):
+            if len(self._models) <= self.max_models:
+                break
+            if not self._in_use.get(key):
+                del self._models[key]
+
+    # Background thread unloading idle models, started with the first job
+    def _start_sweeper(self):
+        if not self.idle_timeout or self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="whisper-model-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 4))
+            for backend, size in self.evict_idle():
+                print(f"Unloaded idle Whisper model {size} ({backend})", file=sys.stderr)
+
+
+# Returns freed weights to the OS (and the GPU allocator, when torch has one)
+def _release_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+# Process-wide manager shared by transcribe.py, the worker and the batch CLI
+MODELS = ModelManager()
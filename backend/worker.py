@@ -0,0 +1,193 @@
+import inspect
+import json
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Backend worker ---
+# A long-lived backend process for the Electron app. Spawning a fresh interpreter per file
+# re-imports openai/regex/whisper, reloads the tag engine and the Whisper model every time;
+# this worker keeps all of that warm and serves jobs over stdio.
+#
+# Protocol: line-delimited JSON-RPC 2.0. Each line on stdin is one request
+#   {"jsonrpc": "2.0", "id": 1, "method": "process", "params": {...}}
+# and each reply is one line on stdout
+#   {"jsonrpc": "2.0", "id": 1, "result": ...}  or  {"jsonrpc": "2.0", "id": 1, "error": {...}}
+# Requests run concurrently, so replies can come back in any order. Anything else the
+# backend prints (progress, warnings) goes to stderr so it cannot corrupt the protocol.
+# The worker exits when stdin closes or on a "shutdown" request.
+
+# Number of jobs that may run at the same time
+WORKER_THREADS = int(os.getenv("MEMORY_FORGE_WORKER_THREADS", "4"))
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+# The real stdout, reserved for replies
+_PROTOCOL = sys.stdout
+sys.stdout = sys.stderr
+_WRITE_LOCK = threading.Lock()
+
+# Imported after the redirect: process.py prints (and exits) at import when the API key is missing
+import tagging
+from process import process
+# whisper and torch themselves are only imported when the first model is loaded
+from transcribe import transcribe
+from audio_cache import AUDIO_CACHE
+from openai_client import OPENAI
+from punctuation_cache import PUNCTUATION_CACHE
+from transcription_backends import BACKENDS, DEFAULT_BACKEND
+from whisper_models import DEFAULT_MODEL, MODEL_SIZES, MODELS
+
+
+# --- Methods ---
+# Each method takes the request params as keyword arguments and returns a JSON-serialisable result
+
+# Turns a text transcript into RAG/SFT records appended to output_path
+# output_format picks jsonl, jsonl.gz, jsonl.zst, parquet or arrow (default: from the path)
+# Output: the formatted text
+def process_transcript(txt_path, title, instruction, mode, output_path, output_format=None):
+    return process(txt_path, title, instruction, mode, output_path, output_format)
+
+
+# Transcribes an audio file with Whisper, then processes it like process_transcript
+# model picks the Whisper size (tiny, base, small, medium) and backend the transcription
+# backend (whisper, whisper-int8, faster-whisper); loaded models stay resident. Long
+# recordings are split at pauses and transcribed by `workers` processes.
+# Output: the formatted text
+def transcribe_audio(mp3_path, title, instruction, mode, output_path, model=None, backend=None, workers=None, output_format=None):
+    return transcribe(mp3_path, title, instruction, mode, output_path, model, backend, workers, output_format)
+
+
+# Whisper models currently loaded as [backend, size] pairs, least recently used first
+def whisper_models():
+    return {
+        "loaded": MODELS.loaded(),
+        "sizes": list(MODEL_SIZES),
+        "default": DEFAULT_MODEL,
+        "backends": list(BACKENDS),
+        "default_backend": DEFAULT_BACKEND,
+    }
+
+
+# Profiles the tag dictionary over transcripts/outputs, see tagging.profile_dictionary
+# Output: the report dict (also written to report_path)
+def profile(report_path, paths):
+    return tagging.profile_dictionary(report_path, paths)
+
+
+# Rebuilds the tag engine after the dictionary file was saved
+# Output: {"changed": bool, "version": dictionary version now in use}
+def reload_dictionary():
+    changed = tagging.reload_engine()
+    return {"changed": changed, "version": tagging.TAG_ENGINE.version}
+
+
+# Hit/miss counts and disk usage of the transcript cache
+def audio_cache_stats():
+    return AUDIO_CACHE.stats()
+
+
+# Hit/miss counts and size of the punctuation cache
+def punctuation_cache_stats():
+    return PUNCTUATION_CACHE.stats()
+
+
+# Requests, retries and rate limiting of the shared OpenAI client
+def openai_stats():
+    return OPENAI.stats()
+
+
+def ping():
+    return {"pid": os.getpid(), "version": tagging.TAG_ENGINE.version}
+
+
+METHODS = {
+    "process": process_transcript,
+    "transcribe": transcribe_audio,
+    "profile": profile,
+    "reload_dictionary": reload_dictionary,
+    "whisper_models": whisper_models,
+    "audio_cache_stats": audio_cache_stats,
+    "punctuation_cache_stats": punctuation_cache_stats,
+    "openai_stats": openai_stats,
+    "ping": ping,
+}
+
+
+# --- Serving ---
+def _reply(request_id, result=None, error=None):
+    message = {"jsonrpc": "2.0", "id": request_id}
+    if error is None:
+        message["result"] = result
+    else:
+        message["error"] = error
+    line = json.dumps(message, ensure_ascii=False)
+    with _WRITE_LOCK:
+        _PROTOCOL.write(line + "\n")
+        _PROTOCOL.flush()
+
+
+def _error(code, message, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return error
+
+
+# Runs one request on a pool thread and replies (notifications without an id get no reply)
+def _handle(request_id, method, params):
+    try:
+        result = method(**params)
+    except Exception as e:
+        print(traceback.format_exc(), file=sys.stderr)
+        if request_id is not None:
+            _reply(request_id, error=_error(SERVER_ERROR, f"{type(e).__name__}: {e}", traceback.format_exc()))
+        return
+    if request_id is not None:
+        _reply(request_id, result)
+
+
+# Reads requests until stdin closes or a shutdown request arrives, then waits for running jobs
+def serve(stream=sys.stdin):
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as pool:
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                _reply(None, error=_error(PARSE_ERROR, str(e)))
+                continue
+            if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+                _reply(request.get("id") if isinstance(request, dict) else None,
+                       error=_error(INVALID_REQUEST, "Expected a JSON-RPC request object"))
+                continue
+
+            request_id = request.get("id")
+            if request["method"] == "shutdown":
+                if request_id is not None:
+                    _reply(request_id, None)
+                break
+            method = METHODS.get(request["method"])
+            if method is None:
+                _reply(request_id, error=_error(METHOD_NOT_FOUND, f"Unknown method {request['method']}"))
+                continue
+            params = request.get("params") or {}
+            try:
+                inspect.signature(method).bind(**params)
+            except TypeError as e:
+                _reply(request_id, error=_error(INVALID_PARAMS, str(e)))
+                continue
+            pool.submit(_handle, request_id, method, params)
+
+
+if __name__ == "__main__":
+    print(f"Backend worker {os.getpid()} ready", file=sys.stderr)
+    serve()
@@ -3,6 +3,7 @@ const { app, BrowserWindow, ipcMain, dialog } = require('electron');
 const path = require('path');
 const { spawn } = require('child_process');
 const fs = require('fs').promises;
+const readline = require('readline');
 
 // Store default directories
 let defaultOpenDirectory = app.getPath("documents");
@@ -66,167 +67,28 @@ ipcMain.handle('dialog:openFile', async () => {
 });
 
 
+const defaultDictionaryPath = path.join(__dirname, '..', 'backend', 'regex_dictionary.json');
+
 ipcMain.handle('regex:load', async () => {
     try {
-        const data = await fs.readFile(regexDictionaryPath, 'utf8');
-        return JSON.parse(data);
+        const dictionary = JSON.parse(await fs.readFile(regexDictionaryPath, 'utf8'));
+
+        // Dictionaries saved before proximity rules existed get the default rules once
+        if (!('_proximity_rules' in dictionary)) {
+            const defaults = JSON.parse(await fs.readFile(defaultDictionaryPath, 'utf8'));
+            dictionary._proximity_rules = defaults._proximity_rules || [];
+            await fs.writeFile(regexDictionaryPath, JSON.stringify(dictionary, null, 2));
+        }
+        return dictionary;
     } catch (error) {
-        // If the file doesn't exist or there's an error, load from process.py
+        // If the file doesn't exist or there's an error, start from the default dictionary
         try {
-            const processFilePath = path.join(__dirname, '..', 'backend', 'process.py');
-            const processContent = await fs.readFile(processFilePath, 'utf8');
-            
-            // Extract the regex dictionary from process.py
-            const regexDictStart = processContent.indexOf('regex_tag_patterns = {');
-            const regexDictEnd = processContent.indexOf('# Clean the text', regexDictStart);
-            
-            if (regexDictStart !== -1 && regexDictEnd !== -1) {
-                const dictionaryString = processContent
-                    .slice(regexDictStart + 'regex_tag_patterns = '.length, regexDictEnd)
-                    .trim();
-
-                // Convert Python dictionary to JavaScript object directly
-                // This is safer than trying to parse it as JSON
-                const pythonToJs = (pythonCode) => {
-                    // Create a clean JavaScript object
-                    let result = {};
-                    
-                    // Remove outer braces and split by top-level commas
-                    const content = pythonCode.trim().slice(1, -1).trim();
-                    
-                    // Parse each key-value pair
-                    let depth = 0;
-                    let currentKey = '';
-                    let currentValue = '';
-                    let inKey = true;
-                    
-                    for (let i = 0; i < content.length; i++) {
-                        const char = content[i];
-                        
-                        // Track nesting depth
-                        if (char === '{' || char === '[') depth++;
-                        else if (char === '}' || char === ']') depth--;
-                        
-                        // At top level, look for key-value separators
-                        if (depth === 0 && char === ':' && inKey) {
-                            currentKey = currentKey.trim().replace(/^['"](.*)['"]$/, '$1');
-                            inKey = false;
-                            continue;
-                        }
-                        
-                        // At top level, look for pair separators
-                        if (depth === 0 && char === ',' && !inKey) {
-                            // Process the value
-                            currentValue = currentValue.trim();
-                            
-                            // Handle different value types
-                            if (currentValue === 'True') result[currentKey] = true;
-                            else if (currentValue === 'False') result[currentKey] = false;
-                            else if (currentValue === 'None') result[currentKey] = null;
-                            else if (currentValue.startsWith('[') && currentValue.endsWith(']')) {
-                                // Handle arrays
-                                const arrayContent = currentValue.slice(1, -1).trim();
-                                const items = [];
-                                
-                                // Parse array items
-                                let itemStart = 0;
-                                let itemDepth = 0;
-                                
-                                for (let j = 0; j <= arrayContent.length; j++) {
-                                    const itemChar = j < arrayContent.length ? arrayContent[j] : ',';
-                                    
-                                    if (itemChar === '{' || itemChar === '[') itemDepth++;
-                                    else if (itemChar === '}' || itemChar === ']') itemDepth--;
-                                    
-                                    if ((itemDepth === 0 && itemChar === ',') || j === arrayContent.length) {
-                                        let item = arrayContent.slice(itemStart, j).trim();
-                                        
-                                        // Handle raw strings and quotes
-                                        if (item.startsWith('r"') && item.endsWith('"')) {
-                                            item = item.slice(2, -1);
-                                        } else if ((item.startsWith('"') && item.endsWith('"')) || 
-                                                 (item.startsWith("'") && item.endsWith("'"))) {
-                                            item = item.slice(1, -1);
-                                        }
-                                        
-                                        if (item) items.push(item);
-                                        itemStart = j + 1;
-                                    }
-                                }
-                                
-                                result[currentKey] = items;
-                            } else if ((currentValue.startsWith('"') && currentValue.endsWith('"')) || 
-                                      (currentValue.startsWith("'") && currentValue.endsWith("'"))) {
-                                // Handle strings
-                                result[currentKey] = currentValue.slice(1, -1);
-                            } else if (currentValue.startsWith('r"') && currentValue.endsWith('"')) {
-                                // Handle raw strings
-                                result[currentKey] = currentValue.slice(2, -1);
-                            } else {
-                                // Try to parse as number or keep as string
-                                const num = parseFloat(currentValue);
-                                result[currentKey] = isNaN(num) ? currentValue : num;
-                            }
-                            
-                            // Reset for next pair
-                            currentKey = '';
-                            currentValue = '';
-                            inKey = true;
-                            continue;
-                        }
-                        
-                        // Accumulate characters
-                        if (inKey) currentKey += char;
-                        else currentValue += char;
-                    }
-                    
-                    // Handle the last pair if there's no trailing comma
-                    if (currentKey && !inKey) {
-                        currentValue = currentValue.trim();
-                        
-                        if (currentValue === 'True') result[currentKey] = true;
-                        else if (currentValue === 'False') result[currentKey] = false;
-                        else if (currentValue === 'None') result[currentKey] = null;
-                        else if (currentValue.startsWith('[') && currentValue.endsWith(']')) {
-                            // Handle arrays (simplified for the last item)
-                            const arrayContent = currentValue.slice(1, -1).trim();
-                            const items = arrayContent.split(',')
-                                .map(item => {
-                                    item = item.trim();
-                                    if (item.startsWith('r"') && item.endsWith('"')) {
-                                        return item.slice(2, -1);
-                                    } else if ((item.startsWith('"') && item.endsWith('"')) || 
-                                             (item.startsWith("'") && item.endsWith("'"))) {
-                                        return item.slice(1, -1);
-                                    }
-                                    return item;
-                                })
-                                .filter(item => item);
-                            
-                            result[currentKey] = items;
-                        } else if ((currentValue.startsWith('"') && currentValue.endsWith('"')) || 
-                                  (currentValue.startsWith("'") && currentValue.endsWith("'"))) {
-                            result[currentKey] = currentValue.slice(1, -1);
-                        } else if (currentValue.startsWith('r"') && currentValue.endsWith('"')) {
-                            result[currentKey] = currentValue.slice(2, -1);
-                        } else {
-                            const num = parseFloat(currentValue);
-                            result[currentKey] = isNaN(num) ? currentValue : num;
-                        }
-                    }
-                    
-                    return result;
-                };
-                
-                const dictionary = pythonToJs(dictionaryString);
-                
-                // Save it to the user data directory for future use
-                await fs.writeFile(regexDictionaryPath, JSON.stringify(dictionary, null, 2));
-                
-                return dictionary;
-            }
-            
-            return {};
+            const dictionary = JSON.parse(await fs.readFile(defaultDictionaryPath, 'utf8'));
+
+            // Save it to the user data directory for future use
+            await fs.writeFile(regexDictionaryPath, JSON.stringify(dictionary, null, 2));
+
+            return dictionary;
         } catch (err) {
             console.error('Error loading regex dictionary:', err);
             return {};
@@ -234,59 +96,36 @@ ipcMain.handle('regex:load', async () => {
     }
 });
 
-// Update the regex:save handler to properly format Python raw strings
+// The backend reads the dictionary straight from regexDictionaryPath (see startWorker),
+// so saving writes the JSON file and tells a running worker to reload it
 ipcMain.handle('regex:save', async (event, dictionary) => {
     try {
-        // Save the JSON version
         await fs.writeFile(regexDictionaryPath, JSON.stringify(dictionary, null, 2));
-        
-        // Convert to Python format for process.py
-        const processFilePath = path.join(__dirname, '..', 'backend', 'process.py');
-        let processContent = await fs.readFile(processFilePath, 'utf8');
-        
-        // Find the regex_tag_patterns dictionary in the file
-        const regexDictStart = processContent.indexOf('regex_tag_patterns = {');
-        const regexDictEnd = processContent.indexOf('# Clean the text', regexDictStart);
-        
-        if (regexDictStart !== -1 && regexDictEnd !== -1) {
-            // Helper function to format Python lists
-            const formatPythonList = (arr) => {
-                return arr.map(item => {
-                    if (typeof item === 'string') {
-                        return `r"${item}"`;
-                    }
-                    return item;
-                });
-            };
-
-            // Convert JSON to Python format
-            let pythonDict = JSON.stringify(dictionary, (key, value) => {
-                if (Array.isArray(value)) {
-                    return formatPythonList(value);
-                }
-                return value;
-            }, 4)
-                .replace(/"([^"]+)":/g, '$1:') // Remove quotes from keys
-                .replace(/: "r"/g, ': r"') // Fix double quoted r prefix
-                .replace(/true/g, 'True')
-                .replace(/false/g, 'False')
-                .replace(/null/g, 'None');
-            
-            // Replace the dictionary content while preserving the rest of the file
-            const newContent = processContent.slice(0, regexDictStart) +
-                'regex_tag_patterns = ' + pythonDict + '\n\n' +
-                processContent.slice(regexDictEnd);
-            
-            await fs.writeFile(processFilePath, newContent, 'utf8');
-            return { success: true, message: 'Regex dictionary saved successfully' };
+        if (worker.child) {
+            await callBackend('reload_dictionary');
         }
-        
-        return { success: false, message: 'Could not locate regex dictionary in process.py' };
+        return { success: true, message: 'Regex dictionary saved successfully' };
     } catch (error) {
         console.error('Error saving regex dictionary:', error);
-        return { success: false, message: error.message };
+        return { success: false, message: error.message || String(error) };
     }
 });
+// Times every saved pattern over sample transcripts/outputs so slow ones can be spotted in the RegexBuilder
+ipcMain.handle('regex:profile', async () => {
+    const { canceled, filePaths } = await dialog.showOpenDialog({
+        defaultPath: defaultOpenDirectory,
+        properties: ['openFile', 'multiSelections'],
+        filters: [{ name: 'Transcripts and Outputs', extensions: ['txt', 'jsonl'] }]
+    });
+
+    if (canceled || filePaths.length === 0) {
+        return null;
+    }
+
+    const reportPath = path.join(app.getPath("userData"), "regex_profile.json");
+    return callBackend('profile', { report_path: reportPath, paths: filePaths });
+});
+
 // Process files IPC endpoints
 ipcMain.handle('process-transcript', async (event, filePath, title, instruction, mode) => {
   const saveDialog = await dialog.showSaveDialog({
@@ -299,10 +138,12 @@ ipcMain.handle('process-transcript', async (event, filePath, title, instruction,
   }
 
   defaultSaveDirectory = path.dirname(saveDialog.filePath);
-  return runPython('process.py', [filePath, title, instruction, mode, saveDialog.filePath]);
+  return callBackend('process', {
+    txt_path: path.normalize(filePath), title, instruction, mode, output_path: path.normalize(saveDialog.filePath)
+  });
 });
 
-ipcMain.handle('transcribe-audio', async (event, filePath, title, instruction, mode) => {
+ipcMain.handle('transcribe-audio', async (event, filePath, title, instruction, mode, model) => {
   if (!filePath) {
     return 'Error: No valid file path provided';
   }
@@ -317,29 +158,125 @@ ipcMain.handle('transcribe-audio', async (event, filePath, title, instruction, m
   }
 
   defaultSaveDirectory = path.dirname(saveDialog.filePath);
-  return runPython('transcribe.py', [filePath, title, instruction, mode, saveDialog.filePath]);
+  return callBackend('transcribe', {
+    mp3_path: path.normalize(filePath), title, instruction, mode, output_path: path.normalize(saveDialog.filePath),
+    // Whisper model size; the worker keeps recently used sizes loaded
+    model: model || null
+  });
 });
 
-function runPython(scriptName, args) {
-  return new Promise((resolve, reject) => {
-    const scriptPath = path.join(__dirname, '..', 'backend', scriptName);
-    const venvPython = process.platform === 'win32'
-      ? path.join(__dirname, '..', 'backend', 'venv', 'Scripts', 'python.exe')
-      : path.join(__dirname, '..', 'backend', 'venv', 'bin', 'python');
+// --- Backend worker ---
+// One long-lived Python process (backend/worker.py) keeps the interpreter, the tag engine and the
+// Whisper model warm across files. Jobs are sent as line-delimited JSON-RPC over stdio; the worker
+// is started on first use and restarted (with backoff) if it crashes.
+const backendDir = path.join(__dirname, '..', 'backend');
+const venvPython = process.platform === 'win32'
+  ? path.join(backendDir, 'venv', 'Scripts', 'python.exe')
+  : path.join(backendDir, 'venv', 'bin', 'python');
 
-    const subprocess = spawn(venvPython, [scriptPath, ...args.map(arg => path.normalize(arg))], {
-      cwd: path.join(__dirname, '..', 'backend')
-    });
+const worker = {
+  child: null,
+  nextId: 1,
+  pending: new Map(),
+  stderrTail: '',
+  startedAt: 0,
+  restartDelay: 1000,
+  restartTimer: null,
+  stopping: false
+};
 
-    let output = '';
-    let errorOutput = '';
+function startWorker() {
+  const child = spawn(venvPython, [path.join(backendDir, 'worker.py')], {
+    cwd: backendDir,
+    // Tag with the dictionary edited in the RegexBuilder (falls back to the default if missing)
+    env: {
+      ...process.env,
+      MEMORY_FORGE_REGEX_DICTIONARY: regexDictionaryPath,
+      // Transcripts of recordings already seen, so re-processing one skips Whisper
+      MEMORY_FORGE_AUDIO_CACHE: path.join(app.getPath("userData"), "audio_cache"),
+      // Punctuated text of windows already sent to OpenAI
+      MEMORY_FORGE_PUNCTUATION_CACHE: path.join(app.getPath("userData"), "punctuation_cache.sqlite3"),
+      PYTHONIOENCODING: 'utf-8'
+    }
+  });
+  worker.child = child;
+  worker.startedAt = Date.now();
+  worker.stderrTail = '';
 
-    subprocess.stdout.on('data', data => output += data.toString());
-    subprocess.stderr.on('data', data => errorOutput += data.toString());
+  readline.createInterface({ input: child.stdout }).on('line', line => {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error('Backend worker sent an invalid line:', line);
+      return;
+    }
+    const job = worker.pending.get(message.id);
+    if (!job) return;
+    worker.pending.delete(message.id);
+    if (message.error) job.reject(message.error.message);
+    else job.resolve(message.result);
+  });
 
-    subprocess.on('close', code => {
-      if (code === 0) resolve(output.trim());
-      else reject(errorOutput || `Script exited with code ${code}`);
-    });
+  child.stderr.on('data', data => {
+    const text = data.toString();
+    console.log('[backend]', text.trimEnd());
+    worker.stderrTail = (worker.stderrTail + text).slice(-4000);
+  });
+
+  // Spawn failures (e.g. no venv) fail the pending jobs; the next job tries again
+  child.on('error', error => {
+    console.error('Backend worker failed to start:', error);
+    if (worker.child !== child) return;
+    worker.child = null;
+    for (const job of worker.pending.values()) job.reject(`Backend worker failed to start: ${error.message}`);
+    worker.pending.clear();
+  });
+  // A write racing the worker's exit is reported through 'exit' instead
+  child.stdin.on('error', () => {});
+
+  child.on('exit', code => {
+    if (worker.child !== child) return;
+    worker.child = null;
+    // Jobs in flight died with the process
+    for (const job of worker.pending.values()) {
+      job.reject(worker.stderrTail || `Backend worker exited with code ${code}`);
+    }
+    worker.pending.clear();
+    if (worker.stopping) return;
+
+    // A worker that ran for a while restarts right away; one that keeps crashing on startup
+    // (e.g. missing API key) backs off up to 30s
+    worker.restartDelay = Date.now() - worker.startedAt > 60000 ? 1000 : Math.min(worker.restartDelay * 2, 30000);
+    console.error(`Backend worker exited with code ${code}, restarting in ${worker.restartDelay}ms`);
+    worker.restartTimer = setTimeout(() => {
+      worker.restartTimer = null;
+      if (!worker.child && !worker.stopping) startWorker();
+    }, worker.restartDelay);
   });
 }
+
+// Sends one job to the worker
+// Resolves with the method's result, rejects with the error message
+function callBackend(method, params = {}) {
+  return new Promise((resolve, reject) => {
+    if (!worker.child) {
+      if (worker.restartTimer) {
+        clearTimeout(worker.restartTimer);
+        worker.restartTimer = null;
+      }
+      startWorker();
+    }
+    const id = worker.nextId++;
+    worker.pending.set(id, { resolve, reject });
+    worker.child.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+  });
+}
+
+app.on('before-quit', () => {
+  worker.stopping = true;
+  if (worker.restartTimer) clearTimeout(worker.restartTimer);
+  if (worker.child) {
+    worker.child.stdin.end(JSON.stringify({ jsonrpc: '2.0', method: 'shutdown' }) + '\n');
+  }
+});
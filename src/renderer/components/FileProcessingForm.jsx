@@ -5,6 +5,10 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Textarea } from '@/components/ui/textarea';
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/card';
+import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
+
+// Whisper model sizes, fastest first
+const WHISPER_MODELS = ['tiny', 'base', 'small', 'medium'];
 
 export const FileProcessingForm = ({ mode }) => {
   const [title, setTitle] = useState('');
@@ -12,6 +16,10 @@ export const FileProcessingForm = ({ mode }) => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [output, setOutput] = useState('');
   const [processing, setProcessing] = useState(false);
+  const [whisperModel, setWhisperModel] = useState('small');
+
+  // Check file extension to determine if it's an audio file
+  const isAudio = /\.(mp3|wav|ogg|m4a)$/i.test(selectedFile || '');
 
   const handleFileSelect = async () => {
     try {
@@ -30,10 +38,8 @@ export const FileProcessingForm = ({ mode }) => {
 
     setProcessing(true);
     try {
-      // Check file extension to determine if it's an audio file
-      const isAudio = /\.(mp3|wav|ogg|m4a)$/i.test(selectedFile);
       const result = isAudio
-        ? await window.electronAPI.transcribeAudio(selectedFile, title, instruction, mode)
+        ? await window.electronAPI.transcribeAudio(selectedFile, title, instruction, mode, whisperModel)
         : await window.electronAPI.processTranscript(selectedFile, title, instruction, mode);
       
       setOutput(result);
@@ -80,6 +86,22 @@ export const FileProcessingForm = ({ mode }) => {
           </div>
         </div>
 
+        {isAudio && (
+          <div className="space-y-2">
+            <Label>Whisper Model</Label>
+            <Select value={whisperModel} onValueChange={setWhisperModel}>
+              <SelectTrigger className="w-full">
+                <SelectValue placeholder="Select model" />
+              </SelectTrigger>
+              <SelectContent>
+                {WHISPER_MODELS.map(size => (
+                  <SelectItem key={size} value={size}>{size}</SelectItem>
+                ))}
+              </SelectContent>
+            </Select>
+          </div>
+        )}
+
         <Button 
           onClick={handleSubmit}
           disabled={!selectedFile || !title || processing}
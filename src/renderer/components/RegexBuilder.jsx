@@ -8,6 +8,9 @@ import { Alert, AlertDescription } from "@/components/ui/alert";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { CustomDialog } from './CustomDialog';
 
+// Keys starting with "_" (e.g. "_proximity_rules") hold dictionary settings, not tag categories
+const tagCategories = (dict) => Object.keys(dict).filter(key => !key.startsWith('_'));
+
 export const RegexBuilder = () => {
   const [dictionary, setDictionary] = useState({});
   const [displayDictionary, setDisplayDictionary] = useState('');
@@ -21,6 +24,8 @@ export const RegexBuilder = () => {
   const [showCategoryDialog, setShowCategoryDialog] = useState(false);
   const [showSubcategoryDialog, setShowSubcategoryDialog] = useState(false);
   const [manualRegex, setManualRegex] = useState('');
+  const [profile, setProfile] = useState(null);
+  const [isProfiling, setIsProfiling] = useState(false);
 
   useEffect(() => {
     loadDictionary();
@@ -28,7 +33,7 @@ export const RegexBuilder = () => {
 
   useEffect(() => {
     if (dictionary) {
-      setCategories(Object.keys(dictionary));
+      setCategories(tagCategories(dictionary));
     }
   }, [dictionary]);
 
@@ -52,7 +57,7 @@ export const RegexBuilder = () => {
       if (loadedDict && typeof loadedDict === 'object') {
         setDictionary(loadedDict);
         updateDisplayDictionary(loadedDict);
-        const cats = Object.keys(loadedDict);
+        const cats = tagCategories(loadedDict);
         console.log('Setting categories:', cats);
         setCategories(cats);
       } else {
@@ -96,7 +101,8 @@ export const RegexBuilder = () => {
     
     try {
       let pythonDict = "{\n";
-      Object.entries(dict).forEach(([category, patterns]) => {
+      tagCategories(dict).forEach((category) => {
+        const patterns = dict[category];
         pythonDict += `  "${category}": {\n`;
         
         // Check if patterns is an array
@@ -182,6 +188,21 @@ export const RegexBuilder = () => {
     }
   };
 
+  const handleProfileDictionary = async () => {
+    setIsProfiling(true);
+    try {
+      const report = await window.electronAPI.profileRegexDictionary();
+      if (report) {
+        setProfile(report);
+        setMessage(`Profiled ${report.patterns.length} patterns over ${report.texts} texts`);
+      }
+    } catch (error) {
+      setMessage('Error profiling dictionary: ' + (error.message || error));
+    } finally {
+      setIsProfiling(false);
+    }
+  };
+
   const handleCreateNewCategory = () => {
     console.log('Opening category dialog...');
     setShowCategoryDialog(true);
@@ -350,6 +371,49 @@ export const RegexBuilder = () => {
           </CardContent>
         </Card>
       )}
+      <Card>
+        <CardHeader>
+          <CardTitle>Pattern Profile</CardTitle>
+        </CardHeader>
+        <CardContent className="grid gap-4">
+          <p className="text-sm text-muted-foreground">
+            Times every pattern of the saved dictionary over sample .txt or .jsonl files and lists the slowest ones.
+            Patterns that hit the per-pattern timeout are skipped during tagging.
+          </p>
+          <Button onClick={handleProfileDictionary} disabled={isProfiling}>
+            {isProfiling ? 'Profiling...' : 'Profile Patterns'}
+          </Button>
+          {profile && (
+            <div className="overflow-auto max-h-[400px]">
+              <table className="w-full text-sm">
+                <thead>
+                  <tr className="text-left">
+                    <th className="p-1">Tag</th>
+                    <th className="p-1">Seconds</th>
+                    <th className="p-1">Share</th>
+                    <th className="p-1">Matches</th>
+                    <th className="p-1">Timeouts</th>
+                    <th className="p-1">Pattern</th>
+                  </tr>
+                </thead>
+                <tbody>
+                  {profile.patterns.slice(0, 20).map(entry => (
+                    <tr key={`${entry.tag}-${entry.index}`} className={entry.timeouts > 0 ? 'text-destructive' : ''}>
+                      <td className="p-1">{entry.tag}</td>
+                      <td className="p-1">{entry.seconds.toFixed(4)}</td>
+                      <td className="p-1">{(entry.share * 100).toFixed(1)}%</td>
+                      <td className="p-1">{entry.matches}</td>
+                      <td className="p-1">{entry.timeouts}</td>
+                      <td className="p-1 font-mono break-all">{entry.source}</td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+          )}
+        </CardContent>
+      </Card>
+
     <CustomDialog
       title="Create New Category"
       isOpen={showCategoryDialog}